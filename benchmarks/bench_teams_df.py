@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+""" Compare gen_teams_df with the row-by-row loop it replaced.
+"""
+
+import argparse
+import sys
+import timeit
+import warnings
+
+import pandas as pd
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from service_reports_generator import gen_teams_df  # noqa: E402
+from synthetic import synthetic_responses  # noqa: E402
+
+
+def legacy_gen_teams_df(df):
+    """gen_teams_df as it was before vectorization, kept for comparison."""
+    cols = df.columns.values
+    df = df.loc[df[cols[5]].notna(), :]
+    df = df.loc[df[cols[6]].notna(), :]
+    df = df[df[cols[6]].str.startswith('Remote')]
+    excl = (
+        "IT and Language Technology services, ACATBA",
+    )
+    df = df[~df[cols[2]].str.startswith(excl)]
+    df = df[[cols[2], cols[5]]]
+    cols = df.columns.values
+    teams = list(set(df[cols[0]].values))
+    teams.sort()
+    new_df = pd.DataFrame(columns=teams)
+    for index, row in df.iterrows():
+        team = row.iloc[0]
+        hours = float(row.iloc[1])
+        if index in new_df.index.values:
+            new_df.at[index, team] = hours
+        else:
+            team_index = teams.index(team)
+            new_row = [0 for i in range(len(teams))]
+            new_row[team_index] = hours
+            new_df.loc[index] = new_row
+            new_df = new_df.sort_index()
+    return new_df
+
+
+def best_time(func, df, repeat):
+    return min(timeit.repeat(lambda: func(df), number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'sizes', nargs='*', type=int, default=[100, 1000, 5000],
+        help="numbers of form responses to benchmark (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--repeat', '-r', type=int, default=3,
+        help="best of N runs (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--legacy-max', type=int, default=5000,
+        help="skip the legacy loop above this size (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', FutureWarning)
+
+    print(f"{'rows':>8} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")  # noqa: E501
+    for size in args.sizes:
+        df = synthetic_responses(size)
+        new = best_time(gen_teams_df, df, args.repeat)
+        if size <= args.legacy_max:
+            old = best_time(legacy_gen_teams_df, df, args.repeat)
+            print(f"{size:>8} {old:>12.4f} {new:>15.4f} {old / new:>7.0f}x")
+        else:
+            print(f"{size:>8} {'-':>12} {new:>15.4f} {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+""" Time each stage of the GL report and session chart pipelines on
+    synthetic data, and save the results as JSON.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+
+import matplotlib
+import pandas as pd
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import glpdf2csv  # noqa: E402
+import gl_ledger  # noqa: E402
+import service_reports_generator as srg  # noqa: E402
+import session_rollups  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def best_time(func, repeat):
+    """Return the fastest of `repeat` runs of func, and its last result."""
+    best = None
+    for _ in range(repeat):
+        # Keep the pipeline's progress messages out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_gl(size, workdir, repeat, with_pdf):
+    timings = {}
+    pages = synthetic.gl_report_pages(size)
+    if with_pdf:
+        pdf_file = workdir / "2401 Bangui Internet-donor report.pdf"
+        synthetic.write_pdf(pages, pdf_file)
+        timings['extract'], _ = best_time(
+            lambda: list(glpdf2csv.iter_pdf_pages(pdf_file)),
+            repeat,
+        )
+    timings['filter'], accounts_entry_lines = best_time(
+        lambda: glpdf2csv.collect_accounts_entries(
+            glpdf2csv.iter_report_lines(pages),
+            [glpdf2csv.DEFAULT_ACCOUNT],
+        ),
+        repeat,
+    )
+    lines = accounts_entry_lines[glpdf2csv.DEFAULT_ACCOUNT]
+    csv_file = workdir / f"2401 CAR {glpdf2csv.DEFAULT_ACCOUNT}.csv"
+    timings['write_csv'], _ = best_time(
+        lambda: glpdf2csv.write_lines_to_csv(lines, csv_file),
+        repeat,
+    )
+    ledger = gl_ledger.Ledger(workdir)
+    timings['build.ledger'], _ = best_time(ledger.rebuild, repeat)
+    timings['load.ledger'], raw_modem_df = best_time(
+        lambda: srg.gen_raw_modem_df(ledger.file),
+        repeat,
+    )
+    timings['clean.ledger'], _ = best_time(
+        lambda: srg.gen_clean_modem_expense_df(raw_modem_df),
+        repeat,
+    )
+    return timings
+
+
+def bench_sessions(size, workdir, repeat):
+    timings = {}
+    responses_file = workdir / "responses.csv"
+    synthetic.write_form_responses_csv(size, responses_file)
+    timings['load.sessions'], raw_df = best_time(
+        lambda: srg.gen_raw_session_df(responses_file),
+        repeat,
+    )
+    timings['clean.sessions'], sessions_df = best_time(
+        lambda: srg.gen_sessions_df(raw_df),
+        repeat,
+    )
+    timings['pivot.sessions'], monthly_df = best_time(
+        lambda: srg.gen_session_df(sessions_df, period='monthly'),
+        repeat,
+    )
+    timings['pivot.teams'], _ = best_time(
+        lambda: srg.gen_teams_df(raw_df),
+        repeat,
+    )
+
+    def build_rollups():
+        db_file = workdir / "rollups.sqlite"
+        db_file.unlink(missing_ok=True)
+        rollups = session_rollups.SessionRollups(db_file)
+        rollups.update(responses_file, lambda: raw_df)
+        return rollups
+
+    timings['build.rollups'], rollups = best_time(build_rollups, repeat)
+    timings['read.sessions'], _ = best_time(
+        lambda: srg.gen_session_totals_df(rollups, 'Remote', 'monthly'),
+        repeat,
+    )
+    timings['read.teams'], _ = best_time(
+        lambda: srg.gen_teams_totals_df(rollups),
+        repeat,
+    )
+
+    def render():
+        fig, _ = srg.gen_session_plot(monthly_df, "Benchmark", 'monthly')
+        fig.savefig(workdir / "benchmark.png")
+        srg.plt.close(fig)
+
+    timings['render'], _ = best_time(render, repeat)
+    return timings
+
+
+def compare(results, baseline_file, threshold):
+    """Print stages that got slower than the baseline; return their count."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)['results']
+    regressions = 0
+    for size, timings in results.items():
+        for stage, secs in timings.items():
+            old = baseline.get(size, {}).get(stage)
+            if not old:
+                continue
+            ratio = secs / old
+            if ratio > threshold:
+                regressions += 1
+                print(f"Slower: {stage} at {size} rows: {old:.4f} s -> {secs:.4f} s ({ratio:.2f}x)")  # noqa: E501
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'sizes', nargs='*', type=int, default=[1000, 10000, 100000],
+        help="numbers of GL entries and form responses (default: %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--repeat', '-r', type=int, default=3,
+        help="best of N runs per stage (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--output', '-o', default='benchmark-results.json',
+        help="JSON file for the results (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--compare', metavar='JSON',
+        help="report stages slower than in this earlier results file",
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help="slowdown ratio that counts as a regression (default: %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--no-pdf', action='store_true',
+        help="skip writing synthetic PDFs and timing text extraction",
+    )
+    args = parser.parse_args()
+    matplotlib.use('agg')
+    srg.setup_plot_style()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for size in args.sizes:
+            print(f"Benchmarking {size} rows...")
+            timings = bench_gl(size, workdir, args.repeat, not args.no_pdf)
+            timings.update(bench_sessions(size, workdir, args.repeat))
+            results[str(size)] = timings
+            for stage, secs in timings.items():
+                print(f"  {stage:<16} {secs:>10.4f} s")
+
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
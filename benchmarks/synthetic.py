@@ -0,0 +1,200 @@
+""" Synthetic GL reports and form responses for benchmarks.
+"""
+
+import csv
+import datetime
+import random
+
+import pandas as pd
+
+ACCOUNTS = (
+    "Bangui Internet: Communications",
+    "Bangui Office: Supplies",
+    "Bangui Vehicles: Fuel",
+    "Bangui Guesthouse: Utilities",
+)
+TEAMS = (
+    "Banda",
+    "Gbaya",
+    "Sango",
+    "Yakoma",
+    "IT and Language Technology services, ACATBA",
+)
+SESSION_FORMATS = (
+    "Remote session (internet)",
+    "Remote session (phone)",
+    "In person",
+)
+DESCRIPTIONS = (
+    "Modem credit for Gbaya team",
+    "Orange modem credit sango translation",
+    "Internet credit Yakoma team",
+    "Modem credit Banda",
+    "Flybox credit",
+    "Bloosat subscription",
+)
+REFERENCES = (
+    "CAR Petty Cash",
+    "CAR Cash FCFA",
+    "CAR ITR USD",
+    "Ecobank transfer",
+)
+FORM_COLUMNS = (
+    'Timestamp',
+    'Email Address',
+    'Work date',
+    'Team / Client',
+    'Consultant',
+    'Description',
+    'Work hours',
+    'Session format',
+    'Notes',
+)
+START_DATE = datetime.date(2020, 1, 1)
+DAYS = 4 * 365
+
+
+def glje_line(rng, number, date):
+    amount = rng.choice((1500, 5000, 10000, 25000))
+    fields = (
+        f"GLJE  {number % 1000000:06d}  {number % 100:02d}",
+        date.strftime('%d-%b-%y'),
+        rng.choice(DESCRIPTIONS),
+        rng.choice(REFERENCES),
+        f"JE{number}",
+        f"{amount:,}",
+        f"{amount * 3:,}",
+    )
+    return '   ' + '   '.join(fields)
+
+
+def gl_report_pages(entries, accounts=ACCOUNTS, lines_per_page=60, seed=0):
+    """Return GL report pages holding about `entries` GLJE lines in total.
+
+    Entries are split evenly among the accounts. Each page starts with a
+    report header, and an account's header line is repeated at the top of
+    each page its block continues on, as in the real reports.
+    """
+    rng = random.Random(seed)
+    pages = []
+    lines = []
+    number = 0
+
+    def new_page():
+        if lines:
+            pages.append('\n'.join(lines) + '\n')
+        lines.clear()
+        lines.append(f"SIL CAR General Ledger{' ' * 40}Page {len(pages) + 1}")
+        lines.append('')
+
+    new_page()
+    per_account = max(entries // len(accounts), 1)
+    for i, account in enumerate(accounts):
+        header = f"  {10000 + i:05d}-R51057   {account}{' ' * 8}Beginning Balance{' ' * 5}0.00"  # noqa: E501
+        lines.append(header)
+        for _ in range(per_account):
+            if len(lines) >= lines_per_page:
+                new_page()
+                lines.append(header)
+            date = START_DATE + datetime.timedelta(days=rng.randrange(DAYS))
+            lines.append(glje_line(rng, number, date))
+            number += 1
+        lines.append(f"  Total {account}")
+    new_page()
+    return pages
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(pages, pdf_file, font_size=7):
+    """Write pages of plain text to a minimal PDF in a monospaced font."""
+    leading = font_size + 1
+    height = 612
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Page tree, once the page objects are numbered.
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>",
+    ]
+    page_refs = []
+    for page in pages:
+        ops = [f"BT /F1 {font_size} Tf {leading} TL 20 {height - 20} Td"]
+        ops.extend(f"({_pdf_escape(ln)}) '" for ln in page.split('\n'))
+        ops.append("ET")
+        stream = '\n'.join(ops).encode('latin-1', 'replace')
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream
+            + b"\nendstream"
+        )
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 792 %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (height, content_ref)
+        )
+        page_refs.append(len(objects))
+    kids = ' '.join(f"{n} 0 R" for n in page_refs)
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode()
+    )
+
+    with open(pdf_file, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for n, obj in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % n + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(objects) + 1, xref)
+        )
+
+
+def synthetic_responses(rows, seed=0):
+    """Build a DataFrame laid out like gen_raw_session_df()'s output."""
+    rng = random.Random(seed)
+    dates = pd.to_datetime(START_DATE) + pd.to_timedelta(
+        [rng.randrange(DAYS) for _ in range(rows)], unit='D'
+    )
+    df = pd.DataFrame(
+        {
+            'Timestamp': range(rows),
+            'Email Address': 'consultant@example.org',
+            'Team / Client': [rng.choice(TEAMS) for _ in range(rows)],
+            'Consultant': 'Consultant',
+            'Description': 'Checking session',
+            'Work hours': [rng.choice((0.5, 1.0, 1.5, 2.0)) for _ in range(rows)],  # noqa: E501
+            'Session format': [rng.choice(SESSION_FORMATS) for _ in range(rows)],  # noqa: E501
+            'Notes': None,
+        },
+        index=pd.DatetimeIndex(dates, name='Work date'),
+    )
+    return df
+
+
+def write_form_responses_csv(rows, csv_file, seed=0):
+    """Write a form responses CSV like the one exported from Google Forms."""
+    rng = random.Random(seed)
+    with open(csv_file, 'w', newline='') as f:
+        csvw = csv.writer(f)
+        csvw.writerow(FORM_COLUMNS)
+        for i in range(rows):
+            date = START_DATE + datetime.timedelta(days=rng.randrange(DAYS))
+            hours = rng.choice(('0,5', '1', '1,5', '2', '3,25'))
+            session_format = rng.choice(SESSION_FORMATS + ('',))
+            csvw.writerow((
+                f"{date:%m/%d/%Y} {i % 24:02d}:{i % 60:02d}:00",
+                'consultant@example.org',
+                f"{date:%m/%d/%Y}",
+                rng.choice(TEAMS),
+                'Consultant',
+                'Checking session',
+                hours,
+                session_format,
+                '',
+            ))
@@ -1,44 +1,499 @@
 #!/usr/bin/python3
 
-# Verifier que un hôte est disponible.
+# Verifier que un hôte est disponible, ou balayer plusieurs hôtes à la fois.
+#
+# Les hôtes sont sondés dans ce processus : en ICMP (echo) si le système le
+# permet, sinon par une connexion TCP à un port. La méthode "ping" lance
+# plutôt la commande ping pour chaque hôte.
+#
+# Exemples :
+#   ./check_address.py 192.168.1.1
+#   ./check_address.py 192.168.1.0/24 10.0.0.5 --concurrence 128
+#   ./check_address.py -f hotes.txt --format csv > resultats.csv
+#   ./check_address.py serveur.local --methode tcp --port 443 --nombre 5
+#   ./check_address.py 192.168.1.0/24 --resultats resultats.sqlite
 
 # Importer des modules dont nous avons besoin
-import subprocess
+import argparse
+import asyncio
+import csv
+import ipaddress
+import itertools
+import os
+import re
+import socket
+import statistics
+import struct
 import sys
+import time
+from collections import namedtuple
 
-# définition variable globale
-MAX_ATTENTE = '3'
-
-# définir l'adresse IP à laquelle on va envoyer les paquets
-adresse = '127.0.0.1' # par défault
-if len(sys.argv) > 1:
-    adresse = sys.argv[1]
-
-# déteriminer le genre de l'OS et définir `shell_command`.
-if sys.platform == 'darwin':
-    print("ATTENTION: Ce script n'est pas encore vérifié sur MacOS.")
-if sys.platform == 'linux' or sys.platform == 'linux2' or sys.platform == 'darwin':
-    shell_command = f"ping -w {MAX_ATTENTE} {adresse}"
-elif sys.platform == 'win32':
-    shell_command = f"ping -w {MAX_ATTENTE} {adresse}"
-    # shell_command = f"ping /w {MAX_ATTENTE} {adresse}"
-else:
-    print(f"Ce script n'est pas compatible avec la plateforme \"{platform}\".")
-    exit(1)
-
-# Executer la commande shell
-completed_process = subprocess.run(
-    shell_command,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.STDOUT,
-    shell=True,
+import resultats
+
+# définition variables globales
+MAX_ATTENTE = 3  # secondes
+CONCURRENCE_MAX = 64
+ADRESSE_PAR_DEFAUT = '127.0.0.1'
+METHODES = ('auto', 'icmp', 'tcp', 'ping')
+PORT_TCP = 80
+COLONNES = (
+    'adresse', 'statut', 'latence_ms', 'min_ms', 'max_ms', 'ecart_ms',
+    'perte_pct', 'methode',
+)
+# Types ICMP : (demande d'écho, réponse d'écho) pour IPv4 et IPv6.
+TYPES_ECHO = {
+    socket.AF_INET: (8, 0),
+    socket.AF_INET6: (128, 129),
+}
+PROTOCOLES_ICMP = {
+    socket.AF_INET: socket.IPPROTO_ICMP,
+    socket.AF_INET6: socket.IPPROTO_ICMPV6,
+}
+
+# Des identifiants différents pour les sondes ICMP de ce processus.
+IDENTIFIANTS = itertools.count(os.getpid())
+
+# Le résultat du sondage d'un hôte. Les latences sont en millisecondes
+# (moyenne, minimum, maximum et écart-type), et None si l'hôte n'a pas
+# répondu.
+Sondage = namedtuple(
+    'Sondage',
+    'adresse statut latence min max ecart perte methode',
 )
+# p.ex. "time=0.045 ms" (Linux, MacOS) ou "temps<1ms" (Windows)
+LATENCE_RE = re.compile(r'(?:time|temps)[=<] ?([0-9]+(?:[.,][0-9]+)?) ?ms')
+
+
+def commande_ping(adresse, attente=MAX_ATTENTE, nombre=1):
+    """Retourner la commande pour envoyer `nombre` paquets à `adresse`."""
+    if sys.platform.startswith('linux'):
+        return [
+            'ping', '-c', str(nombre), '-w', str(attente * nombre), adresse,
+        ]
+    elif sys.platform == 'darwin':
+        return [
+            'ping', '-c', str(nombre), '-t', str(attente * nombre), adresse,
+        ]
+    elif sys.platform == 'win32':
+        # Sous Windows, l'attente est en millisecondes.
+        return ['ping', '-n', str(nombre), '-w', str(attente * 1000), adresse]
+    else:
+        raise OSError(
+            f"Ce script n'est pas compatible avec la plateforme \"{sys.platform}\"."  # noqa: E501
+        )
+
+
+def lire_latences(sortie):
+    """Trouver les latences en secondes dans la sortie de ping."""
+    return [
+        float(m.replace(',', '.')) / 1000 for m in LATENCE_RE.findall(sortie)
+    ]
+
+
+def somme_de_controle(donnees):
+    """Calculer la somme de contrôle d'un paquet ICMP (RFC 1071)."""
+    if len(donnees) % 2:
+        donnees += b'\0'
+    somme = sum(struct.unpack(f'!{len(donnees) // 2}H', donnees))
+    somme = (somme >> 16) + (somme & 0xffff)
+    somme += somme >> 16
+    return ~somme & 0xffff
+
+
+class SondeIcmp:
+    """Envoyer des demandes d'écho ICMP depuis un seul socket.
+
+    Un socket brut (SOCK_RAW) demande les droits d'administrateur. Sinon,
+    Linux permet des sockets ICMP "datagramme" aux groupes cités dans
+    /proc/sys/net/ipv4/ping_group_range. Les réponses de tous les hôtes
+    arrivent sur le même socket et sont reconnues par leur numéro de
+    séquence.
+    """
+
+    def __init__(self, famille=socket.AF_INET):
+        self.famille = famille
+        self.type_demande, self.type_reponse = TYPES_ECHO[famille]
+        protocole = PROTOCOLES_ICMP[famille]
+        try:
+            self.socket = socket.socket(famille, socket.SOCK_RAW, protocole)
+            self.brut = True
+        except PermissionError:
+            self.socket = socket.socket(famille, socket.SOCK_DGRAM, protocole)
+            self.brut = False
+        self.socket.setblocking(False)
+        # Avec un socket datagramme, le noyau choisit l'identifiant.
+        self.identifiant = next(IDENTIFIANTS) & 0xffff
+        self.sequence = 0
+        self.en_attente = {}
+        self.boucle = asyncio.get_running_loop()
+        try:
+            self.boucle.add_reader(self.socket.fileno(), self._lire_reponses)
+        except NotImplementedError:
+            # La boucle Proactor de Windows ne surveille pas les sockets.
+            self.socket.close()
+            raise OSError("Sondage ICMP impossible avec cette boucle asyncio")
+
+    def fermer(self):
+        self.boucle.remove_reader(self.socket.fileno())
+        self.socket.close()
+
+    def _paquet(self, sequence):
+        donnees = b'check_address'
+        entete = struct.pack(
+            '!BBHHH', self.type_demande, 0, 0, self.identifiant, sequence,
+        )
+        if self.famille == socket.AF_INET:
+            # En IPv6, le noyau calcule la somme de contrôle.
+            somme = somme_de_controle(entete + donnees)
+            entete = entete[:2] + struct.pack('!H', somme) + entete[4:]
+        return entete + donnees
+
+    def _lire_reponses(self):
+        while True:
+            try:
+                donnees, adresse = self.socket.recvfrom(2048)
+            except OSError:
+                # Plus rien à lire pour le moment (BlockingIOError).
+                return
+            arrivee = time.perf_counter()
+            if self.brut and self.famille == socket.AF_INET:
+                # Sauter l'en-tête IPv4.
+                donnees = donnees[(donnees[0] & 0x0f) * 4:]
+            if len(donnees) < 8:
+                continue
+            type_icmp, _, _, identifiant, sequence = struct.unpack(
+                '!BBHHH', donnees[:8],
+            )
+            if type_icmp != self.type_reponse:
+                continue
+            if self.brut and identifiant != self.identifiant:
+                # Réponse à un autre programme.
+                continue
+            attendu = self.en_attente.get(sequence)
+            if attendu is None or attendu[1].done():
+                continue
+            if ipaddress.ip_address(adresse[0].split('%')[0]) == attendu[0]:
+                attendu[1].set_result(arrivee)
+
+    async def sonder(self, ip, attente=MAX_ATTENTE):
+        """Retourner la latence d'un écho ICMP en secondes, ou None."""
+        self.sequence = (self.sequence + 1) & 0xffff
+        sequence = self.sequence
+        reponse = self.boucle.create_future()
+        self.en_attente[sequence] = (ipaddress.ip_address(ip), reponse)
+        try:
+            depart = time.perf_counter()
+            self.socket.sendto(self._paquet(sequence), (ip, 0))
+            return await asyncio.wait_for(reponse, attente) - depart
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            del self.en_attente[sequence]
+
+
+async def sonder_tcp(famille, ip, port=PORT_TCP, attente=MAX_ATTENTE):
+    """Retourner le temps d'une connexion TCP en secondes, ou None.
+
+    Un refus de connexion compte comme une réponse : l'hôte est joignable
+    même si rien n'écoute sur ce port.
+    """
+    boucle = asyncio.get_running_loop()
+    with socket.socket(famille, socket.SOCK_STREAM) as s:
+        s.setblocking(False)
+        depart = time.perf_counter()
+        try:
+            await asyncio.wait_for(boucle.sock_connect(s, (ip, port)), attente)
+        except ConnectionRefusedError:
+            pass
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return time.perf_counter() - depart
+
+
+async def sonder_ping(adresse, attente=MAX_ATTENTE, nombre=1):
+    """Lancer ping; retourner si l'hôte a répondu, et les latences."""
+    commande = commande_ping(adresse, attente, nombre)
+    try:
+        # Pas de shell : les arguments sont passés tels quels à ping.
+        processus = await asyncio.create_subprocess_exec(
+            *commande,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    except OSError as e:
+        print(f"Erreur: {adresse}: {e}", file=sys.stderr)
+        return False, []
+    sortie, _ = await processus.communicate()
+    if processus.returncode != 0:
+        return False, []
+    return True, lire_latences(sortie.decode(errors='replace'))
+
+
+def resumer(adresse, methode, repond, latences, nombre):
+    """Faire le Sondage d'un hôte à partir de ses latences en secondes."""
+    perte = round(100 * (1 - len(latences) / nombre), 1)
+    if not repond:
+        return Sondage(adresse, 'down', None, None, None, None, 100.0, methode)
+    if not latences:
+        return Sondage(adresse, 'up', None, None, None, None, perte, methode)
+    ms = [t * 1000 for t in latences]
+    return Sondage(
+        adresse,
+        'up',
+        round(statistics.mean(ms), 3),
+        round(min(ms), 3),
+        round(max(ms), 3),
+        round(statistics.pstdev(ms), 3),
+        perte,
+        methode,
+    )
+
+
+class Sondeur:
+    """Sonder des hôtes avec une méthode choisie.
+
+    Avec la méthode "auto", les hôtes sont sondés en ICMP si un socket ICMP
+    peut être ouvert, et sinon par TCP. Les sockets ICMP sont partagés par
+    tous les sondages de la même famille d'adresses. Appeler fermer() à la
+    fin.
+    """
+
+    def __init__(self, methode='auto', port=PORT_TCP, attente=MAX_ATTENTE,
+                 nombre=1):
+        self.methode = methode
+        self.port = port
+        self.attente = attente
+        self.nombre = max(nombre, 1)
+        self.sondes_icmp = {}
+
+    def fermer(self):
+        for sonde in self.sondes_icmp.values():
+            if sonde:
+                sonde.fermer()
+        self.sondes_icmp = {}
+
+    def _sonde_icmp(self, famille):
+        if famille not in self.sondes_icmp:
+            try:
+                self.sondes_icmp[famille] = SondeIcmp(famille)
+            except OSError:
+                if self.methode == 'icmp':
+                    raise
+                self.sondes_icmp[famille] = None
+        return self.sondes_icmp[famille]
+
+    async def _resoudre(self, adresse):
+        try:
+            ip = ipaddress.ip_address(adresse)
+        except ValueError:
+            pass
+        else:
+            famille = socket.AF_INET6 if ip.version == 6 else socket.AF_INET
+            return famille, adresse
+        boucle = asyncio.get_running_loop()
+        infos = await boucle.getaddrinfo(
+            adresse, None, type=socket.SOCK_STREAM,
+        )
+        famille, _, _, _, adresse_socket = infos[0]
+        return famille, adresse_socket[0]
+
+    async def sonder(self, adresse):
+        if self.methode == 'ping':
+            repond, latences = await sonder_ping(
+                adresse, self.attente, self.nombre,
+            )
+            return resumer(adresse, 'ping', repond, latences, self.nombre)
+
+        try:
+            famille, ip = await self._resoudre(adresse)
+        except OSError as e:
+            print(f"Erreur: {adresse}: {e}", file=sys.stderr)
+            return resumer(adresse, self.methode, False, [], self.nombre)
+        sonde = None
+        if self.methode in ('auto', 'icmp'):
+            sonde = self._sonde_icmp(famille)
+        latences = []
+        for _ in range(self.nombre):
+            if sonde:
+                latence = await sonde.sonder(ip, self.attente)
+            else:
+                latence = await sonder_tcp(famille, ip, self.port, self.attente)  # noqa: E501
+            if latence is not None:
+                latences.append(latence)
+        methode = 'icmp' if sonde else 'tcp'
+        return resumer(adresse, methode, bool(latences), latences, self.nombre)
+
+
+async def balayer(adresses, sondeur=None, concurrence=CONCURRENCE_MAX):
+    """Sonder toutes les adresses, au plus `concurrence` à la fois.
+
+    Les résultats sont retournés dans l'ordre des adresses.
+    """
+    if sondeur is None:
+        sondeur = Sondeur()
+    semaphore = asyncio.Semaphore(concurrence)
+
+    async def sonder(adresse):
+        async with semaphore:
+            return await sondeur.sonder(adresse)
+
+    try:
+        return await asyncio.gather(*(sonder(a) for a in adresses))
+    finally:
+        sondeur.fermer()
+
+
+async def verifier(adresse=ADRESSE_PAR_DEFAUT, methode='auto', port=PORT_TCP,
+                   attente=MAX_ATTENTE, nombre=1):
+    """Vérifier un seul hôte; retourner un statut, un message et la latence.
+
+    Le statut est 'ok' si l'hôte répond, sinon 'alerte'. La latence est en
+    millisecondes, ou None.
+    """
+    sondeur = Sondeur(methode, port, attente, nombre)
+    sondage, = await balayer([adresse], sondeur, 1)
+    if sondage.statut == 'up':
+        return 'ok', f'Hôte "{adresse}" est active.', sondage.latence
+    return 'alerte', f'Hôte "{adresse}" est hors service.', None
+
+
+def developper_cible(cible):
+    """Retourner les adresses d'une cible : adresse, nom d'hôte ou réseau."""
+    if '/' not in cible:
+        return [cible]
+    reseau = ipaddress.ip_network(cible, strict=False)
+    hotes = list(reseau.hosts())
+    if not hotes:
+        # Un réseau /32 (ou /128) n'a qu'une adresse.
+        hotes = [reseau.network_address]
+    return [str(h) for h in hotes]
+
+
+def lire_fichier_hotes(chemin):
+    """Lire les cibles d'un fichier : une ou plusieurs par ligne.
+
+    Tout ce qui suit un "#" est un commentaire.
+    """
+    cibles = []
+    with open(chemin, encoding='UTF-8') as f:
+        for ligne in f:
+            cibles.extend(ligne.split('#', 1)[0].split())
+    return cibles
+
+
+def developper_cibles(cibles):
+    """Retourner toutes les adresses des cibles, sans doublons."""
+    adresses = []
+    for cible in cibles:
+        adresses.extend(developper_cible(cible))
+    return list(dict.fromkeys(adresses))
+
+
+def afficher_tableau(sondages, format='tsv', sortie=sys.stdout):
+    delimiteur = ',' if format == 'csv' else '\t'
+    ecrivain = csv.writer(sortie, delimiter=delimiteur, lineterminator='\n')
+    ecrivain.writerow(COLONNES)
+    for sondage in sondages:
+        ecrivain.writerow(['' if v is None else v for v in sondage])
+
+
+def en_resultats(sondages, duree):
+    """Retourner un Resultat par hôte; la valeur est la latence en ms."""
+    horodatage = resultats.maintenant()
+    return [
+        resultats.resultat(
+            'check_address',
+            s.adresse,
+            'ok' if s.statut == 'up' else 'alerte',
+            s.latence,
+            f"{s.statut} ({s.methode}, perte {s.perte} %)",
+            duree,
+            horodatage,
+        )
+        for s in sondages
+    ]
+
+
+def analyser_arguments():
+    parser = argparse.ArgumentParser(
+        description="Vérifier si des hôtes répondent au ping.",
+    )
+    parser.add_argument(
+        'cibles', nargs='*', metavar='CIBLE',
+        help=f"adresse, nom d'hôte ou réseau CIDR (par défaut : {ADRESSE_PAR_DEFAUT})",  # noqa: E501
+    )
+    parser.add_argument(
+        '--fichier', '-f', action='append', default=[],
+        help="fichier de cibles, une ou plusieurs par ligne",
+    )
+    parser.add_argument(
+        '--concurrence', '-c', type=int, default=CONCURRENCE_MAX,
+        help="nombre maximum de pings en même temps (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--attente', '-w', type=int, default=MAX_ATTENTE,
+        help="secondes d'attente pour chaque hôte (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--methode', '-m', choices=METHODES, default='auto',
+        help="ICMP dans ce processus, connexion TCP, commande ping, ou ICMP si possible et sinon TCP (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--port', '-p', type=int, default=PORT_TCP,
+        help="port des sondages TCP (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--nombre', '-n', type=int, default=1,
+        help="nombre de sondages par hôte (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--format', choices=('tsv', 'csv'), default='tsv',
+        help="format du tableau de résultats (par défaut : %(default)s)",
+    )
+    resultats.ajouter_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = analyser_arguments()
+    if sys.platform == 'darwin':
+        print(
+            "ATTENTION: Ce script n'est pas encore vérifié sur MacOS.",
+            file=sys.stderr,
+        )
+
+    cibles = list(args.cibles)
+    for chemin in args.fichier:
+        cibles.extend(lire_fichier_hotes(chemin))
+    balayage = args.fichier or len(cibles) > 1 or any('/' in c for c in cibles)
+    try:
+        adresses = developper_cibles(cibles or [ADRESSE_PAR_DEFAUT])
+        if args.methode == 'ping':
+            commande_ping(ADRESSE_PAR_DEFAUT)  # Plateforme compatible ?
+        sortie = resultats.sortie_des_arguments(args)
+        sondeur = Sondeur(args.methode, args.port, args.attente, args.nombre)
+        debut = time.perf_counter()
+        sondages = asyncio.run(
+            balayer(adresses, sondeur, max(args.concurrence, 1))
+        )
+        duree = time.perf_counter() - debut
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    if sortie:
+        with sortie:
+            sortie.ajouter_tous(en_resultats(sondages, duree))
+        if resultats.sur_sortie_standard(args):
+            return
+    if balayage:
+        afficher_tableau(sondages, args.format)
+    else:
+        # Afficher les resultats comme avant pour une seule adresse.
+        sondage = sondages[0]
+        statut = 'active' if sondage.statut == 'up' else 'hors service'
+        print(f'Hôte "{sondage.adresse}" est {statut}.')
 
-# Set status depending on command returncode.
-if completed_process.returncode == 0:
-    statut = 'active'
-else:
-    statut = 'hors service'
 
-# Afficher les resultats.
-print(f'Hôte "{adresse}" est {statut}.')
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,598 @@
 #!/usr/bin/python3
 
+# Vérifier l'utilisation des disques.
+#
+# Sans option, seul le disque du dossier actuel est vérifié, comme avant.
+# Avec --tous, tous les systèmes de fichiers montés sont lus dans ce
+# processus (/proc/self/mounts et os.statvfs), sans lancer de commande, et
+# l'utilisation de l'espace et des inodes est comparée aux limites.
+#
+# Avec --historique, chaque mesure est ajoutée à l'historique du montage,
+# un tampon circulaire de taille fixe dans un fichier binaire. Une
+# régression linéaire sur cet historique donne la vitesse de remplissage
+# et le temps avant que le disque soit plein, et l'alerte se déclenche sur
+# ce temps plutôt que sur un pourcentage (tant qu'il n'y a pas assez de
+# mesures, le pourcentage compte encore). La limite des inodes compte
+# toujours.
+#
+# Exemples :
+#   ./check_disk.py
+#   ./check_disk.py --tous
+#   ./check_disk.py --tous --limite 0.9 --limite-montage /home=0.8 --format csv
+#   ./check_disk.py --tous --historique ~/.cache/check_disk --alerte-jours 7
+#   ./check_disk.py --tous --resultats disques.jsonl
+
 # Importation des modules.
+import argparse
+import csv
+import math
+import os
 import shutil
+import string
+import struct
+import sys
+import time
+import urllib.parse
+from collections import namedtuple
 from pathlib import Path
 
+import resultats
+
 # Définition de variable globale.
 limite = 0.85
+LIMITE_INODES = 0.85
+FICHIER_MONTAGES = '/proc/self/mounts'
+# Systèmes de fichiers virtuels, ou toujours pleins (squashfs des snaps),
+# ignorés sauf avec --tous-types.
+TYPES_IGNORES = frozenset((
+    'autofs', 'binfmt_misc', 'bpf', 'cgroup', 'cgroup2', 'configfs',
+    'debugfs', 'devpts', 'devtmpfs', 'efivarfs', 'fusectl', 'hugetlbfs',
+    'mqueue', 'nsfs', 'proc', 'pstore', 'ramfs', 'rpc_pipefs',
+    'securityfs', 'squashfs', 'sysfs', 'tmpfs', 'tracefs',
+))
+COLONNES = (
+    'montage', 'peripherique', 'type', 'total', 'libre', 'utilise',
+    'pourcentage', 'inodes', 'inodes_libres', 'pourcentage_inodes', 'statut',
+)
+COLONNES_HISTORIQUE = ('octets_par_jour', 'jours_avant_plein', 'mesures')
+JOUR_EN_SECONDES = 24 * 60 * 60
+# Nombre de mesures gardées par montage : 2 jours toutes les 5 minutes.
+CAPACITE_HISTORIQUE = 576
+ALERTE_JOURS = 7
+# Moins de mesures ne donnent pas de tendance fiable.
+MESURES_MIN = 3
+
+Montage = namedtuple('Montage', 'point peripherique type')
+# Les tailles sont en octets, et les pourcentages entre 0 et 1. Les champs
+# des inodes sont None si le système de fichiers n'en a pas.
+Usage = namedtuple(
+    'Usage',
+    'montage total libre utilise pourcentage inodes inodes_libres '
+    'pourcentage_inodes',
+)
+
+
+def decoder_champ(champ):
+    """Décoder les espaces, etc. écrits "\\040" dans /proc/self/mounts."""
+    if '\\' not in champ:
+        return champ
+    return champ.encode().decode('unicode_escape').encode('latin-1').decode()
+
+
+def lire_montages(fichier=FICHIER_MONTAGES, types_ignores=TYPES_IGNORES):
+    """Retourner les systèmes de fichiers montés, un par point de montage.
+
+    Sans /proc (Windows, MacOS), retourner les lecteurs ou la racine.
+    """
+    try:
+        with open(fichier, encoding='UTF-8', errors='replace') as f:
+            lignes = f.readlines()
+    except OSError:
+        if sys.platform == 'win32':
+            return [
+                Montage(f"{lettre}:\\", f"{lettre}:", '')
+                for lettre in string.ascii_uppercase
+                if os.path.exists(f"{lettre}:\\")
+            ]
+        return [Montage('/', '', '')]
+    montages = {}
+    for ligne in lignes:
+        champs = ligne.split()
+        if len(champs) < 3 or champs[2] in types_ignores:
+            continue
+        point = decoder_champ(champs[1])
+        # Le dernier montage sur un point cache les précédents.
+        montages[point] = Montage(point, decoder_champ(champs[0]), champs[2])
+    return list(montages.values())
+
+
+def mesurer(montage):
+    """Retourner l'Usage d'un système de fichiers monté."""
+    if not hasattr(os, 'statvfs'):
+        usage = shutil.disk_usage(montage.point)
+        pourcentage = usage.used / usage.total if usage.total else 0
+        return Usage(montage, usage.total, usage.free, usage.used,
+                     pourcentage, None, None, None)
+    st = os.statvfs(montage.point)
+    total = st.f_blocks * st.f_frsize
+    # Comme df : l'espace libre est celui que les utilisateurs peuvent
+    # utiliser, sans l'espace réservé à root.
+    libre = st.f_bavail * st.f_frsize
+    utilise = (st.f_blocks - st.f_bfree) * st.f_frsize
+    pourcentage = utilise / (utilise + libre) if utilise + libre else 0
+    inodes = inodes_libres = pourcentage_inodes = None
+    if st.f_files:
+        inodes = st.f_files
+        inodes_libres = st.f_favail
+        pourcentage_inodes = (st.f_files - st.f_ffree) / st.f_files
+    return Usage(montage, total, libre, utilise, pourcentage, inodes,
+                 inodes_libres, pourcentage_inodes)
+
+
+def mesurer_tout(montages=None):
+    """Mesurer tous les systèmes de fichiers montés en une seule passe."""
+    if montages is None:
+        montages = lire_montages()
+    usages = []
+    for montage in montages:
+        try:
+            usages.append(mesurer(montage))
+        except OSError:
+            # Pas permis, ou plus monté.
+            continue
+    return usages
+
+
+class Historique:
+    """Les dernières mesures d'un montage, dans un tampon circulaire.
+
+    Le fichier a un en-tête de taille fixe suivi de `capacite` mesures de
+    taille fixe (ENREGISTREMENT). Quand le tampon est plein, chaque
+    nouvelle mesure remplace la plus ancienne. L'en-tête garde aussi les
+    sommes de la régression linéaire de l'espace utilisé en fonction du
+    temps, mises à jour à chaque mesure : ajouter une mesure ne lit que
+    l'en-tête et la mesure remplacée, jamais tout l'historique.
+
+    Les temps et les tailles des sommes sont comptés à partir de t0 et y0,
+    la plus ancienne mesure, pour garder la précision des calculs. Les
+    sommes sont recalculées depuis les mesures à chaque tour du tampon,
+    pour ne pas accumuler d'erreurs d'arrondi.
+
+    Un fichier existant garde la capacité de son en-tête : `capacite`
+    ne sert qu'à créer un nouveau fichier.
+    """
+
+    # magique, version, capacité, nombre, tête, t0, y0, et les sommes
+    # de t, y, t*t et t*y.
+    ENTETE = struct.Struct('<4sHIII6d')
+    # temps, octets utilisés, octets libres
+    ENREGISTREMENT = struct.Struct('<dQQ')
+    MAGIQUE = b'CDHI'
+    VERSION = 1
+
+    def __init__(self, fichier, capacite=CAPACITE_HISTORIQUE):
+        self.fichier = Path(fichier)
+        self.capacite = capacite
+        self._initialiser()
+        self._lire_entete()
+
+    def _initialiser(self):
+        if self.fichier.is_file():
+            with self.fichier.open('rb') as f:
+                donnees = f.read(self.ENTETE.size)
+            if len(donnees) == self.ENTETE.size:
+                magique, version, capacite, *_ = self.ENTETE.unpack(donnees)
+                if (magique, version) == (self.MAGIQUE, self.VERSION) and capacite > 0:  # noqa: E501
+                    # Ne pas perdre les mesures pour une autre capacité.
+                    self.capacite = capacite
+                    return
+        # Nouveau fichier, ou d'un autre format : recommencer à zéro.
+        self.fichier.parent.mkdir(parents=True, exist_ok=True)
+        with self.fichier.open('wb') as f:
+            f.write(self.ENTETE.pack(
+                self.MAGIQUE, self.VERSION, self.capacite, 0, 0,
+                0.0, 0.0, 0.0, 0.0, 0.0, 0.0,
+            ))
+            f.write(bytes(self.ENREGISTREMENT.size * self.capacite))
+
+    def _lire_entete(self):
+        with self.fichier.open('rb') as f:
+            (_, _, _, self.nombre, self.tete, self.t0, self.y0,
+             self.st, self.sy, self.stt, self.sty) = self.ENTETE.unpack(
+                f.read(self.ENTETE.size)
+            )
+
+    def _position(self, indice):
+        return self.ENTETE.size + indice * self.ENREGISTREMENT.size
+
+    def _ajouter_aux_sommes(self, t, y, signe=1):
+        t -= self.t0
+        y -= self.y0
+        self.st += signe * t
+        self.sy += signe * y
+        self.stt += signe * t * t
+        self.sty += signe * t * y
+
+    def ajouter(self, t, utilise, libre):
+        """Ajouter une mesure; remplacer la plus ancienne si c'est plein."""
+        with self.fichier.open('r+b') as f:
+            if self.nombre == 0:
+                self.t0, self.y0 = t, utilise
+            if self.nombre == self.capacite:
+                # Retirer des sommes la mesure remplacée.
+                f.seek(self._position(self.tete))
+                ancien_t, ancien_y, _ = self.ENREGISTREMENT.unpack(
+                    f.read(self.ENREGISTREMENT.size)
+                )
+                self._ajouter_aux_sommes(ancien_t, ancien_y, -1)
+            else:
+                self.nombre += 1
+            f.seek(self._position(self.tete))
+            f.write(self.ENREGISTREMENT.pack(t, utilise, libre))
+            self._ajouter_aux_sommes(t, utilise)
+            self.tete = (self.tete + 1) % self.capacite
+            if self.tete == 0:
+                self._recalculer(f)
+            f.seek(0)
+            f.write(self.ENTETE.pack(
+                self.MAGIQUE, self.VERSION, self.capacite, self.nombre,
+                self.tete, self.t0, self.y0,
+                self.st, self.sy, self.stt, self.sty,
+            ))
+
+    def mesures(self, f=None):
+        """Retourner les mesures (temps, utilisé, libre), en ordre."""
+        if f is None:
+            with self.fichier.open('rb') as f:
+                return self.mesures(f)
+        f.seek(self._position(0))
+        donnees = f.read(self.ENREGISTREMENT.size * self.capacite)
+        tous = list(self.ENREGISTREMENT.iter_unpack(donnees))
+        if self.nombre < self.capacite:
+            return tous[:self.nombre]
+        return tous[self.tete:] + tous[:self.tete]
+
+    def _recalculer(self, f):
+        mesures = self.mesures(f)
+        self.t0, self.y0 = mesures[0][0], mesures[0][1]
+        self.st = self.sy = self.stt = self.sty = 0.0
+        for t, y, _ in mesures:
+            self._ajouter_aux_sommes(t, y)
+
+    def pente(self):
+        """Retourner la croissance de l'espace utilisé en octets par seconde.
+
+        Retourner None s'il n'y a pas assez de mesures.
+        """
+        n = self.nombre
+        if n < MESURES_MIN:
+            return None
+        denominateur = n * self.stt - self.st * self.st
+        if denominateur <= 0:
+            return None
+        return (n * self.sty - self.st * self.sy) / denominateur
+
+
+Tendance = namedtuple('Tendance', 'octets_par_jour jours_avant_plein mesures')
+
+
+def fichier_historique(dossier, montage):
+    """Retourner le fichier d'historique d'un point de montage."""
+    return Path(dossier) / f"{urllib.parse.quote(montage.point, safe='')}.bin"
+
+
+def enregistrer(usage, dossier, capacite=CAPACITE_HISTORIQUE, t=None):
+    """Ajouter l'usage à l'historique de son montage; retourner la Tendance."""
+    historique = Historique(fichier_historique(dossier, usage.montage), capacite)  # noqa: E501
+    historique.ajouter(time.time() if t is None else t, usage.utilise, usage.libre)  # noqa: E501
+    pente = historique.pente()
+    if usage.libre == 0:
+        # Déjà plein, même sans assez de mesures pour une pente.
+        octets = None if pente is None else pente * JOUR_EN_SECONDES
+        return Tendance(octets, 0.0, historique.nombre)
+    if pente is None:
+        return Tendance(None, None, historique.nombre)
+    jours = math.inf
+    if pente > 0:
+        jours = usage.libre / pente / JOUR_EN_SECONDES
+    return Tendance(pente * JOUR_EN_SECONDES, jours, historique.nombre)
+
+
+def bientot_plein(tendance, alerte_jours=ALERTE_JOURS):
+    """Dire si le disque sera plein dans moins de `alerte_jours` jours."""
+    return (
+        tendance.jours_avant_plein is not None
+        and tendance.jours_avant_plein < alerte_jours
+    )
+
+
+def montage_de(chemin, montages=None):
+    """Retourner le montage qui contient `chemin`."""
+    if montages is None:
+        montages = lire_montages(types_ignores=())
+    chemin = os.path.realpath(chemin)
+    contenants = [
+        m for m in montages
+        if chemin == m.point
+        or chemin.startswith(m.point.rstrip(os.sep) + os.sep)
+    ]
+    if not contenants:
+        return Montage(chemin, '', '')
+    return max(contenants, key=lambda m: len(m.point))
+
+
+def depasse(usage, limite=limite, limites=None, limite_inodes=LIMITE_INODES):
+    """Dire si l'usage dépasse la limite de son montage, ou celle des inodes.
+
+    `limites` donne des limites par point de montage, p.ex. {'/home': 0.8}.
+    """
+    if limites:
+        limite = limites.get(usage.montage.point, limite)
+    if usage.pourcentage > limite:
+        return True
+    return inodes_depassees(usage, limite_inodes)
+
+
+def inodes_depassees(usage, limite_inodes=LIMITE_INODES):
+    """Dire si la part des inodes utilisés dépasse `limite_inodes`."""
+    return (
+        usage.pourcentage_inodes is not None
+        and usage.pourcentage_inodes > limite_inodes
+    )
+
+
+def en_alerte(usage, tendance=None, limite=limite, limites=None,
+              limite_inodes=LIMITE_INODES, alerte_jours=ALERTE_JOURS):
+    """Dire si un montage est en alerte.
+
+    Avec une Tendance qui prévoit quand le disque sera plein, l'alerte vient
+    de cette prévision; sans Tendance, ou tant qu'il n'y a pas assez de
+    mesures, elle vient de la limite du montage. La limite des inodes compte
+    dans les deux cas.
+    """
+    if tendance is None or tendance.jours_avant_plein is None:
+        return depasse(usage, limite, limites, limite_inodes)
+    return (
+        bientot_plein(tendance, alerte_jours)
+        or inodes_depassees(usage, limite_inodes)
+    )
+
+
+def racine_actuelle():
+    # Évaluation de racine de disque.
+    # https://docs.python.org/fr/3/library/pathlib.html?highlight=cwd#pathlib.Path.cwd
+    cwd = Path.cwd()
+    return cwd.root or cwd.drive
+
+
+def verifier(chemin=None, limite=limite, limites=None,
+             limite_inodes=LIMITE_INODES, tous=False, historique=None,
+             alerte_jours=ALERTE_JOURS, capacite=CAPACITE_HISTORIQUE):
+    """Vérifier l'utilisation du disque.
+
+    Retourner un statut, un message et la part utilisée du disque (la plus
+    grande, avec `tous`). Sans `tous`, seul le disque qui contient `chemin`
+    (par défaut, la racine du dossier actuel) est vérifié. Le statut est
+    'alerte' si plus de `limite` d'un disque est utilisé, ou, avec le
+    dossier `historique`, si un disque sera plein dans moins de
+    `alerte_jours` jours (voir en_alerte()).
+    """
+    if tous:
+        usages = mesurer_tout()
+        pleins = [
+            u for u in usages
+            if en_alerte(
+                u,
+                enregistrer(u, historique, capacite) if historique else None,
+                limite, limites, limite_inodes, alerte_jours,
+            )
+        ]
+        plus_plein = max((round(u.pourcentage, 4) for u in usages), default=None)  # noqa: E501
+        if pleins:
+            points = ', '.join(u.montage.point for u in pleins)
+            return 'alerte', f"Disques presque pleins : {points}", plus_plein
+        return 'ok', f"{len(usages)} disques OK", plus_plein
+
+    if chemin is None:
+        chemin = racine_actuelle()
+
+    # Recherche des détails du disque.
+    usage = mesurer(montage_de(chemin))
+    statut, message = evaluer(
+        usage, limite, limites, limite_inodes, historique, alerte_jours,
+        capacite,
+    )
+    return statut, message, round(usage.pourcentage, 4)
+
+
+def evaluer(usage, limite=limite, limites=None, limite_inodes=LIMITE_INODES,
+            historique=None, alerte_jours=ALERTE_JOURS,
+            capacite=CAPACITE_HISTORIQUE):
+    """Retourner le statut et le message de verifier() pour un Usage mesuré."""
+    # Sortie définie selon la tendance, ou selon pourcentage et limite.
+    tendance = None
+    if historique:
+        tendance = enregistrer(usage, historique, capacite)
+    if en_alerte(usage, tendance, limite, limites, limite_inodes, alerte_jours):  # noqa: E501
+        return 'alerte', "Trop de vidéos !"
+    else:
+        return 'ok', "Pas assez de vidéos !"
+
+
+def afficher_tableau(usages, limite=limite, limites=None,
+                     limite_inodes=LIMITE_INODES, format='tsv',
+                     sortie=sys.stdout, tendances=None,
+                     alerte_jours=ALERTE_JOURS):
+    """Afficher l'usage de chaque montage, et sa tendance s'il y en a."""
+    delimiteur = ',' if format == 'csv' else '\t'
+    ecrivain = csv.writer(sortie, delimiter=delimiteur, lineterminator='\n')
+    ecrivain.writerow(COLONNES + (COLONNES_HISTORIQUE if tendances else ()))
+    for i, u in enumerate(usages):
+        tendance = tendances[i] if tendances else None
+        plein = en_alerte(
+            u, tendance, limite, limites, limite_inodes, alerte_jours,
+        )
+        statut = 'alerte' if plein else 'ok'
+        pourcentage_inodes = ''
+        if u.pourcentage_inodes is not None:
+            pourcentage_inodes = f"{u.pourcentage_inodes:.4f}"
+        colonnes_tendance = ()
+        if tendances:
+            octets, jours, nombre = tendances[i]
+            colonnes_tendance = (
+                '' if octets is None else round(octets),
+                '' if jours is None else f"{jours:.2f}",
+                nombre,
+            )
+        ecrivain.writerow((
+            u.montage.point,
+            u.montage.peripherique,
+            u.montage.type,
+            u.total,
+            u.libre,
+            u.utilise,
+            f"{u.pourcentage:.4f}",
+            '' if u.inodes is None else u.inodes,
+            '' if u.inodes_libres is None else u.inodes_libres,
+            pourcentage_inodes,
+            statut,
+        ) + colonnes_tendance)
+
+
+def en_resultats(usages, duree, limite=limite, limites=None,
+                 limite_inodes=LIMITE_INODES, tendances=None,
+                 alerte_jours=ALERTE_JOURS):
+    """Retourner un Resultat par montage; la valeur est la part utilisée."""
+    horodatage = resultats.maintenant()
+    liste = []
+    for i, u in enumerate(usages):
+        tendance = tendances[i] if tendances else None
+        plein = en_alerte(
+            u, tendance, limite, limites, limite_inodes, alerte_jours,
+        )
+        if tendance:
+            jours = tendance.jours_avant_plein
+            message = "plein dans ? jours" if jours is None else f"plein dans {jours:.2f} jours"  # noqa: E501
+        else:
+            message = f"{u.libre} octets libres sur {u.total}"
+        liste.append(resultats.resultat(
+            'check_disk',
+            u.montage.point,
+            'alerte' if plein else 'ok',
+            round(u.pourcentage, 4),
+            message,
+            duree,
+            horodatage,
+        ))
+    return liste
+
+
+def limite_de_montage(texte):
+    point, _, valeur = texte.rpartition('=')
+    if not point:
+        raise argparse.ArgumentTypeError(f"MONTAGE=LIMITE attendu : {texte}")
+    return point, float(valeur)
+
+
+def analyser_arguments():
+    parser = argparse.ArgumentParser(
+        description="Vérifier l'utilisation des disques.",
+    )
+    parser.add_argument(
+        '--tous', action='store_true',
+        help="vérifier tous les systèmes de fichiers montés",
+    )
+    parser.add_argument(
+        '--tous-types', action='store_true',
+        help="avec --tous, inclure tmpfs, squashfs, etc.",
+    )
+    parser.add_argument(
+        '--limite', type=float, default=limite,
+        help="part utilisée qui déclenche une alerte (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--limite-montage', type=limite_de_montage, action='append',
+        default=[], metavar='MONTAGE=LIMITE',
+        help="limite pour un point de montage, p.ex. /home=0.8",
+    )
+    parser.add_argument(
+        '--limite-inodes', type=float, default=LIMITE_INODES,
+        help="part des inodes utilisée qui déclenche une alerte (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--historique', metavar='DOSSIER',
+        help="garder les mesures dans DOSSIER et alerter selon le temps avant que le disque soit plein",  # noqa: E501
+    )
+    parser.add_argument(
+        '--alerte-jours', type=float, default=ALERTE_JOURS,
+        help="avec --historique, alerter si un disque sera plein dans moins de jours que ça (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--capacite', type=int, default=CAPACITE_HISTORIQUE,
+        help="nombre de mesures gardées par montage, pour les nouveaux historiques (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--format', choices=('tsv', 'csv'), default='tsv',
+        help="format du tableau de --tous (par défaut : %(default)s)",
+    )
+    resultats.ajouter_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = analyser_arguments()
+    limites = dict(args.limite_montage)
+    try:
+        sortie = resultats.sortie_des_arguments(args)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    if not args.tous:
+        debut = time.perf_counter()
+        usage = mesurer(montage_de(racine_actuelle()))
+        statut, message = evaluer(
+            usage,
+            limite=args.limite,
+            limites=limites,
+            limite_inodes=args.limite_inodes,
+            historique=args.historique,
+            alerte_jours=args.alerte_jours,
+            capacite=args.capacite,
+        )
+        duree = time.perf_counter() - debut
+        if sortie:
+            with sortie:
+                sortie.ajouter(resultats.resultat(
+                    'check_disk', usage.montage.point, statut,
+                    round(usage.pourcentage, 4), message, duree,
+                ))
+            if resultats.sur_sortie_standard(args):
+                return
+        print(message)
+        return
+
+    debut = time.perf_counter()
+    types_ignores = () if args.tous_types else TYPES_IGNORES
+    usages = mesurer_tout(lire_montages(types_ignores=types_ignores))
+    tendances = None
+    if args.historique:
+        tendances = [
+            enregistrer(u, args.historique, args.capacite) for u in usages
+        ]
+    duree = time.perf_counter() - debut
+    if sortie:
+        with sortie:
+            sortie.ajouter_tous(en_resultats(
+                usages, duree, args.limite, limites, args.limite_inodes,
+                tendances, args.alerte_jours,
+            ))
+        if resultats.sur_sortie_standard(args):
+            return
+    afficher_tableau(
+        usages, args.limite, limites, args.limite_inodes, args.format,
+        tendances=tendances, alerte_jours=args.alerte_jours,
+    )
+
 
-# Évaluation de racine de disque.
-# https://docs.python.org/fr/3/library/pathlib.html?highlight=cwd#pathlib.Path.cwd
-cwd = Path.cwd()
-root = cwd.root or cwd.drive
-
-# Recherche des détails du disque.
-# https://docs.python.org/fr/3/library/shutil.html?highlight=usage#shutil.disk_usage
-usage = shutil.disk_usage(root)
-
-# Calcul d'ultilisation de disque en pourcentage.
-p_utilise = usage.used / usage.total
-# Sortie définie selon pourcentage et limite.
-if p_utilise > limite:
-    print("Trop de vidéos !")
-else:
-    print("Pas assez de vidéos !")
+if __name__ == '__main__':
+    main()
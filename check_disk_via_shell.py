@@ -3,43 +3,67 @@
 # Developpé par Brian Yee et Nate Marti.
 
 # Importer des modules dont nous avons besoin
-from subprocess import check_output
 from sys import platform
 
+import check_disk
+
 # définition variable globale
 LIMITE = 0.85
 
-# déteriminer le genre de l'OS et définir `shell_command`.
-if platform == 'darwin':
-    print("ATTENTION: Ce script n'est pas encore vérifié sur MacOS.")
-if platform == 'linux' or platform == 'linux2' or platform == 'darwin':
-    shell_command = "lsblk --bytes --output=FSAVAIL,MOUNTPOINT,SIZE | grep \"\s/\s\""
-elif platform == 'win32':
-    shell_command = "wmic logicaldisk GET Name,Size,FreeSpace | find /i \"C:\""
-else:
-    print(f"Ce script n'est pas compatible avec la plateforme \"{platform}\".")
-    exit(1)
-
-# Executer la commande shell et parser ce qui sort
-sortie_comme_octets = check_output(shell_command, shell=True)
-sortie_comme_string = sortie_comme_octets.decode()
-sortie_sans_fins_de_ligne = sortie_comme_string.strip()
-sortie_parsee = sortie_sans_fins_de_ligne.split()
-
-# Définir variables pour l'analyse
-espace_libre = int(sortie_parsee[0]) # convert to a number
-nom_de_disque = sortie_parsee[1]
-capacite = int(sortie_parsee[2]) # convert to a number
-
-# Calculer le pourcentage d'utilisation
-pourcentage_utilise = (capacite - espace_libre) / capacite
-pourcentage = "{:.2%}".format(pourcentage_utilise)
-
-# Afficher les resultats
-print(f'Le disque {nom_de_disque} a la capacité de {capacite} et il a l\'espace libre de {espace_libre}')
-print(f'Ça fait {pourcentage}')
-
-if (pourcentage_utilise > LIMITE):
-    print('Le disque s\'approche sa capacité')
-else:
-    print('Le disque est OK')
+
+def racine():
+    # déteriminer le genre de l'OS et le disque à vérifier.
+    if platform == 'linux' or platform == 'linux2' or platform == 'darwin':
+        return '/'
+    elif platform == 'win32':
+        return 'C:\\'
+    else:
+        raise OSError(f"Ce script n'est pas compatible avec la plateforme \"{platform}\".")
+
+
+def verifier(limite=LIMITE):
+    """Vérifier l'utilisation du disque; retourner un statut, un message et
+    la part utilisée du disque.
+
+    Le statut est 'alerte' si plus de `limite` du disque est utilisé. Les
+    mesures viennent de check_disk, sans lancer lsblk ou wmic.
+    """
+    usage = check_disk.mesurer(check_disk.montage_de(racine()))
+
+    # Définir variables pour l'analyse
+    espace_libre = usage.libre
+    nom_de_disque = usage.montage.point.rstrip('\\')
+    capacite = usage.total
+
+    # Calculer le pourcentage d'utilisation
+    pourcentage_utilise = usage.pourcentage
+    pourcentage = "{:.2%}".format(pourcentage_utilise)
+
+    # Préparer les resultats
+    lignes = [
+        f'Le disque {nom_de_disque} a la capacité de {capacite} et il a l\'espace libre de {espace_libre}',
+        f'Ça fait {pourcentage}',
+    ]
+    if (pourcentage_utilise > limite):
+        lignes.append('Le disque s\'approche sa capacité')
+        statut = 'alerte'
+    else:
+        lignes.append('Le disque est OK')
+        statut = 'ok'
+    return statut, '\n'.join(lignes), round(pourcentage_utilise, 4)
+
+
+def main():
+    if platform == 'darwin':
+        print("ATTENTION: Ce script n'est pas encore vérifié sur MacOS.")
+    try:
+        statut, message, _ = verifier()
+    except OSError as e:
+        print(e)
+        exit(1)
+    # Afficher les resultats
+    print(message)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,45 +1,499 @@
 #!/usr/bin/python3
 
+# Chercher du contenu récent dans un journal comme un journal Apache.
+#
+# Par défaut, le fichier est projeté en mémoire (mmap) et une recherche
+# dichotomique trouve la première ligne plus récente que la date limite,
+# sans lire tout le fichier. Avec --etat, le script garde entre deux
+# exécutions la position déjà lue et l'inode du fichier, et ne lit que les
+# lignes ajoutées depuis, même après une rotation du journal.
+#
+# Avec --stats, le script compte en une seule lecture les requêtes par
+# tranche de temps, les codes de statut, les méthodes et les octets servis
+# (format "common" ou "combined" d'Apache).
+#
+# Exemples :
+#   ./check_log_file.py
+#   ./check_log_file.py /var/log/apache2/access.log --jours 1
+#   ./check_log_file.py /var/log/apache2/access.log --etat ~/.check_log.json
+#   ./check_log_file.py /var/log/apache2/access.log --stats --tranche jour
+#   ./check_log_file.py /var/log/apache2/access.log --resultats journal.csv
+
 # Importer des modules dont nous avons besoin
+import argparse
+import functools
+import json
+import mmap
 import sys
 import time
+from collections import Counter
 from pathlib import Path
 from datetime import datetime,timezone,timedelta
 
+import resultats
+
 # définition variable globale
 JOUR_EN_SECONDS = 24 * 60 * 60
 OFFSET = 4 * JOUR_EN_SECONDS
-
-# Créer une date OFFSET avant ce moment-ci
-exemple_date = datetime.fromtimestamp(time.time() - OFFSET, timezone(timedelta(hours=1)))
-
-trouve = 0
 # Path va aller selon la plateforme utilisée
 # Ce fichier est un journal qui est comme un journal Apache
-chemin_de_fichier = Path("./datafiles/log_file")
+CHEMIN_PAR_DEFAUT = Path("./datafiles/log_file")
+FORMAT_DATE = "%d/%b/%Y:%H:%M:%S %z"
+TAILLE_BLOC = 1024 * 1024
+MOIS = {
+    m: i for i, m in enumerate(
+        (b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun',
+         b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec'),
+        start=1,
+    )
+}
+# Pour chaque tranche de --stats : le début de la date qui la définit, et
+# de quoi compléter la date.
+TRANCHES = {
+    'minute': (17, b':00'),
+    'heure': (14, b':00:00'),
+    'jour': (11, b':00:00:00'),
+}
+
+
+@functools.lru_cache(maxsize=64)
+def fuseau(decalage):
+    """Retourner le fuseau horaire d'un décalage comme b'+0100'."""
+    if len(decalage) != 5 or decalage[:1] not in (b'+', b'-'):
+        raise ValueError(f"Décalage horaire invalide : {decalage!r}")
+    heures_minutes = timedelta(
+        hours=int(decalage[1:3]),
+        minutes=int(decalage[3:5]),
+    )
+    if decalage[:1] == b'-':
+        heures_minutes = -heures_minutes
+    return timezone(heures_minutes)
+
+
+def analyser_date(texte):
+    """Lire une date comme b'25/Mar/2022:14:53:48 +0100'.
+
+    Donne le même résultat que datetime.strptime(texte, FORMAT_DATE), en
+    bien moins de temps : les champs sont à des positions fixes, les mois
+    sont lus dans une table, et les fuseaux horaires sont gardés en cache.
+    Lève ValueError si la date n'a pas ce format.
+    """
+    # Les séparateurs : b'/' est 47, b':' est 58 et b' ' est 32.
+    if (len(texte) != 26 or texte[2] != 47 or texte[6] != 47
+            or texte[11] != 58 or texte[14] != 58 or texte[17] != 58
+            or texte[20] != 32):
+        raise ValueError(f"Date invalide : {texte!r}")
+    try:
+        mois = MOIS[texte[3:6]]
+    except KeyError:
+        raise ValueError(f"Mois invalide : {texte!r}")
+    return datetime(
+        int(texte[7:11]),
+        mois,
+        int(texte[0:2]),
+        int(texte[12:14]),
+        int(texte[15:17]),
+        int(texte[18:20]),
+        tzinfo=fuseau(texte[21:26]),
+    )
+
+
+def date_de_ligne(ligne):
+    """Retourner la date d'une ligne (en octets), ou None s'il n'y en a pas."""
+    # Separate out date from rest of line
+    substring_debut = ligne.find(b'[')
+    substring_fin = ligne.find(b']', substring_debut + 1)
+    if substring_debut < 0 or substring_fin < 0:
+        return None
+    try:
+        # Turn string into datetime object
+        return analyser_date(ligne[(substring_debut+1):(substring_fin)])
+    except ValueError:
+        return None
+
+
+class Statistiques:
+    """Compter les requêtes d'un journal Apache au fil de la lecture.
+
+    Les requêtes sont comptées par tranche de temps (minute, heure ou
+    jour), par code de statut et par méthode, et les octets servis sont
+    additionnés. Les tranches sont gardées sous forme de texte pendant la
+    lecture, et ne sont converties en dates qu'à la fin.
+    """
+
+    def __init__(self, tranche='heure'):
+        self.longueur, self.complement = TRANCHES[tranche]
+        self.tranches = Counter()
+        self.statuts = Counter()
+        self.methodes = Counter()
+        self.octets = 0
+        self.requetes = 0
+        self.ignorees = 0
+
+    def ajouter(self, ligne):
+        # p.ex. 1.2.3.4 - - [25/Mar/2022:14:53:48 +0100] "GET / HTTP/1.1" 200 2326 ...  # noqa: E501
+        debut = ligne.find(b'[')
+        fin = ligne.find(b']', debut + 1)
+        guillemet = ligne.find(b'"', fin + 1)
+        fin_requete = ligne.find(b'"', guillemet + 1)
+        if debut < 0 or fin != debut + 27 or guillemet < 0 or fin_requete < 0:
+            if ligne.strip():
+                self.ignorees += 1
+            return
+        champs = ligne[fin_requete + 1:].split(None, 2)
+        if len(champs) < 2:
+            self.ignorees += 1
+            return
+        date = ligne[debut + 1:fin]
+        self.tranches[date[:self.longueur] + date[20:]] += 1
+        self.methodes[ligne[guillemet + 1:fin_requete].split(b' ', 1)[0]] += 1  # noqa: E501
+        self.statuts[champs[0]] += 1
+        if champs[1].isdigit():
+            self.octets += int(champs[1])
+        self.requetes += 1
+
+    def resultats(self):
+        """Retourner les totaux dans un dict, avec les tranches en ordre."""
+        tranches = {}
+        ignorees = self.ignorees
+        requetes = self.requetes
+        for cle, nombre in self.tranches.items():
+            try:
+                date = analyser_date(cle[:-6] + self.complement + cle[-6:])
+            except ValueError:
+                # Pas une date, après tout.
+                ignorees += nombre
+                requetes -= nombre
+                continue
+            tranches[date] = tranches.get(date, 0) + nombre
+        return {
+            'requetes': requetes,
+            'ignorees': ignorees,
+            'octets': self.octets,
+            'tranches': {
+                d.isoformat(): n for d, n in sorted(tranches.items())
+            },
+            'statuts': {
+                s.decode('latin-1'): n for s, n in sorted(self.statuts.items())  # noqa: E501
+            },
+            'methodes': {
+                m.decode('latin-1'): n for m, n in self.methodes.most_common()  # noqa: E501
+            },
+        }
+
+
+def afficher_statistiques(resultats):
+    print(f"Requêtes : {resultats['requetes']} (lignes ignorées : {resultats['ignorees']})")  # noqa: E501
+    print(f"Octets servis : {resultats['octets']}")
+    for titre, cle in (
+        ("Par tranche", 'tranches'),
+        ("Codes de statut", 'statuts'),
+        ("Méthodes", 'methodes'),
+    ):
+        print(f"{titre} :")
+        for nom, nombre in resultats[cle].items():
+            print(f"  {nom:<25} {nombre:>10}")
+
+
+def premiere_date_apres(mm, debut, fin):
+    """Trouver la 1re ligne datée qui commence dans mm[debut:fin].
+
+    Retourner sa date et la position de la ligne suivante, ou (None, fin).
+    """
+    while debut < fin:
+        fin_de_ligne = mm.find(b'\n', debut)
+        if fin_de_ligne < 0:
+            fin_de_ligne = len(mm)
+        date = date_de_ligne(mm[debut:fin_de_ligne])
+        if date is not None:
+            return date, fin_de_ligne + 1
+        debut = fin_de_ligne + 1
+    return None, fin
+
+
+def chercher_apres(mm, limite):
+    """Retourner la position de la 1re ligne plus récente que `limite`.
+
+    Les lignes doivent être en ordre chronologique. Retourne len(mm) si
+    aucune ligne n'est plus récente.
+    """
+    bas, haut = 0, len(mm)
+    # Les lignes avant `bas` ne sont pas plus récentes que `limite`, et
+    # la ligne à `haut` (s'il y en a une) l'est.
+    while bas < haut:
+        milieu = (bas + haut) // 2
+        debut = mm.rfind(b'\n', bas, milieu) + 1 or bas
+        date, suivante = premiere_date_apres(mm, debut, haut)
+        if date is None or date > limite:
+            haut = debut
+        else:
+            bas = suivante
+    # Sauter les lignes sans date.
+    date, suivante = premiere_date_apres(mm, bas, len(mm))
+    if date is None or date <= limite:
+        return len(mm)
+    return bas
+
+
+def derniere_date(mm):
+    """Retourner la date de la dernière ligne datée, ou None."""
+    fin = len(mm)
+    while fin > 0:
+        debut = mm.rfind(b'\n', 0, fin - 1) + 1
+        date = date_de_ligne(mm[debut:fin])
+        if date is not None:
+            return date
+        fin = debut
+    return None
+
+
+def ouvrir_mmap(chemin):
+    """Projeter le fichier en mémoire; retourner None s'il est vide."""
+    with open(chemin, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def date_la_plus_recente(chemin):
+    """Retourner la date de la dernière ligne datée du journal, ou None."""
+    mm = ouvrir_mmap(chemin)
+    if mm is None:
+        return None
+    with mm:
+        return derniere_date(mm)
+
+
+def lire_lignes(chemin, position, traiter):
+    """Appeler traiter(ligne) pour chaque ligne complète après `position`.
+
+    Les lignes sont en octets, sans fin de ligne. Retourner la position
+    après la dernière ligne lue. Une dernière ligne sans fin de ligne,
+    encore en cours d'écriture, sera lue la prochaine fois.
+    """
+    reste = b''
+    with open(chemin, 'rb') as f:
+        f.seek(position)
+        for bloc in iter(lambda: f.read(TAILLE_BLOC), b''):
+            lignes = (reste + bloc).split(b'\n')
+            reste = lignes.pop()
+            for ligne in lignes:
+                traiter(ligne)
+            position += len(bloc)
+    return position - len(reste)
+
+
+def statistiques_depuis(chemin, limite=None, tranche='heure'):
+    """Compter les requêtes plus récentes que `limite` (toutes si None)."""
+    stats = Statistiques(tranche)
+    position = 0
+    if limite is not None:
+        mm = ouvrir_mmap(chemin)
+        if mm is None:
+            return stats
+        with mm:
+            position = chercher_apres(mm, limite)
+    lire_lignes(chemin, position, stats.ajouter)
+    return stats
+
+
+def identifiant_de_fichier(stat):
+    return [stat.st_dev, stat.st_ino]
+
+
+def suivre(chemin, etat, traiter=None):
+    """Lire seulement ce qui a été ajouté au journal depuis la dernière fois.
+
+    `etat` (un dict, mis à jour ici) garde l'inode du fichier, la position
+    déjà lue et la date la plus récente vue. Si l'inode a changé, le
+    journal a été remplacé par rotation : la fin de l'ancien fichier est
+    lue dans "<chemin>.1" s'il est là, puis le nouveau depuis le début. Un
+    fichier plus court que la position lue a été vidé, et il est relu
+    depuis le début. Chaque nouvelle ligne est aussi passée à traiter(),
+    s'il est donné. Retourner la date la plus récente vue, ou None.
+    """
+    chemin = Path(chemin)
+    stat = chemin.stat()
+    identifiant = identifiant_de_fichier(stat)
+    plus_recente = etat.get('derniere_date')
+    if plus_recente:
+        plus_recente = datetime.fromisoformat(plus_recente)
+
+    if 'position' not in etat:
+        # Première fois : pas besoin de tout lire pour trouver la date la
+        # plus récente.
+        mm = ouvrir_mmap(chemin)
+        position = 0
+        if mm is not None:
+            with mm:
+                plus_recente = derniere_date(mm)
+                position = mm.rfind(b'\n') + 1
+    else:
+        position = etat['position']
+        fichiers = []
+        if etat['inode'] != identifiant:
+            ancien = chemin.with_name(f"{chemin.name}.1")
+            if ancien.exists() and identifiant_de_fichier(ancien.stat()) == etat['inode']:  # noqa: E501
+                fichiers.append((ancien, position))
+            position = 0
+        elif stat.st_size < position:
+            position = 0
+        fichiers.append((chemin, position))
+
+        def lire(ligne):
+            nonlocal plus_recente
+            date = date_de_ligne(ligne)
+            if date:
+                plus_recente = max(plus_recente or date, date)
+            if traiter:
+                traiter(ligne)
+
+        for fichier, debut in fichiers:
+            position = lire_lignes(fichier, debut, lire)
+
+    etat['inode'] = identifiant
+    etat['position'] = position
+    etat['derniere_date'] = plus_recente.isoformat() if plus_recente else None
+    return plus_recente
+
+
+def lire_etat(fichier_etat):
+    try:
+        with open(fichier_etat, encoding='UTF-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def sauver_etat(etats, fichier_etat):
+    fichier_etat = Path(fichier_etat)
+    temporaire = fichier_etat.with_name(f"{fichier_etat.name}.tmp")
+    with temporaire.open('w', encoding='UTF-8') as f:
+        json.dump(etats, f, indent=2)
+    temporaire.replace(fichier_etat)
+
+
+def verifier(chemin=CHEMIN_PAR_DEFAUT, decalage=OFFSET, fichier_etat=None):
+    """Chercher du contenu récent dans le journal.
+
+    Retourner un statut, un message et l'âge en secondes de la ligne la
+    plus récente (None si aucune). Le statut est 'alerte' si rien n'a été
+    écrit depuis `decalage` secondes. Avec `fichier_etat`, seules les
+    lignes ajoutées depuis la dernière vérification sont lues.
+    """
+    # Créer une date `decalage` avant ce moment-ci
+    exemple_date = datetime.fromtimestamp(time.time() - decalage, timezone(timedelta(hours=1)))
+
+    if fichier_etat:
+        etats = lire_etat(fichier_etat)
+        cle = str(Path(chemin).resolve())
+        plus_recente = suivre(chemin, etats.setdefault(cle, {}))
+        sauver_etat(etats, fichier_etat)
+    else:
+        # Les lignes sont en ordre : il suffit de lire la dernière.
+        plus_recente = date_la_plus_recente(chemin)
+    trouve = plus_recente is not None and plus_recente > exemple_date
+
+    age = None
+    if plus_recente is not None:
+        age = round(time.time() - plus_recente.timestamp(), 3)
+    if trouve:
+        return 'ok', f"Il y a du contentu du journal trouvé depuis {exemple_date}", age
+    else:
+        return 'alerte', f"Aucun contenu du journal trouvé depuis {exemple_date}", age
+
+
+def analyser_arguments():
+    parser = argparse.ArgumentParser(
+        description="Chercher du contenu récent dans un journal Apache.",
+    )
+    parser.add_argument(
+        'chemin', nargs='?', type=Path, default=CHEMIN_PAR_DEFAUT,
+        help="fichier journal (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--jours', type=float,
+        help=f"chercher du contenu plus récent que ce nombre de jours (par défaut : {OFFSET // JOUR_EN_SECONDS}; avec --stats, tout le journal)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--etat', '-e',
+        help="fichier JSON où garder la position lue, pour ne lire que les nouvelles lignes",  # noqa: E501
+    )
+    parser.add_argument(
+        '--stats', action='store_true',
+        help="compter les requêtes par tranche, statut et méthode, et les octets servis",  # noqa: E501
+    )
+    parser.add_argument(
+        '--tranche', choices=TRANCHES, default='heure',
+        help="durée des tranches de --stats (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--json', action='store_true',
+        help="afficher les résultats de --stats en JSON",
+    )
+    resultats.ajouter_arguments(parser)
+    return parser.parse_args()
 
-if chemin_de_fichier.exists():
-    with chemin_de_fichier.open("r", encoding="UTF-8") as log_file:
-        lignes = log_file.readlines()
-        for ligne in lignes:
-            ligne_crue = ligne.strip()
 
-            # Separate out date from rest of line
-            substring_debut = ligne_crue.find('[')
-            substring_fin = ligne_crue.find(']')
-            date_de_ligne = ligne_crue[(substring_debut+1):(substring_fin)]
+def main():
+    args = analyser_arguments()
+    chemin_de_fichier = args.chemin
+    if not chemin_de_fichier.exists():
+        print("Erreur: opening file" + str(chemin_de_fichier), file=sys.stderr)
+        exit(1)
+    try:
+        sortie = resultats.sortie_des_arguments(args)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        exit(1)
 
-            # Turn string into datetime object
-            journal_date = datetime.strptime(date_de_ligne, "%d/%b/%Y:%H:%M:%S %z")
+    debut = time.perf_counter()
+    if args.stats:
+        if args.etat:
+            # Seulement les lignes ajoutées depuis la dernière fois.
+            stats = Statistiques(args.tranche)
+            etats = lire_etat(args.etat)
+            cle = str(chemin_de_fichier.resolve())
+            suivre(chemin_de_fichier, etats.setdefault(cle, {}), stats.ajouter)  # noqa: E501
+            sauver_etat(etats, args.etat)
+        else:
+            limite = None
+            if args.jours is not None:
+                limite = datetime.fromtimestamp(time.time() - args.jours * JOUR_EN_SECONDS, timezone.utc)  # noqa: E501
+            stats = statistiques_depuis(chemin_de_fichier, limite, args.tranche)  # noqa: E501
+        totaux = stats.resultats()
+        if sortie:
+            # La valeur est le nombre de requêtes comptées.
+            with sortie:
+                sortie.ajouter(resultats.resultat(
+                    'check_log_file', chemin_de_fichier, 'ok',
+                    totaux['requetes'], f"{totaux['octets']} octets servis",
+                    time.perf_counter() - debut,
+                ))
+            if resultats.sur_sortie_standard(args):
+                return
+        if args.json:
+            print(json.dumps(totaux, indent=2))
+        else:
+            afficher_statistiques(totaux)
+        return
 
-            if journal_date > exemple_date:
-                trouve = 1
-else:
-    print("Erreur: opening file" + str(chemin_de_fichier), file=sys.stderr)
-    exit(1)
+    jours = args.jours if args.jours is not None else OFFSET / JOUR_EN_SECONDS
+    statut, message, age = verifier(
+        chemin_de_fichier,
+        jours * JOUR_EN_SECONDS,
+        args.etat,
+    )
+    if sortie:
+        with sortie:
+            sortie.ajouter(resultats.resultat(
+                'check_log_file', chemin_de_fichier, statut, age, message,
+                time.perf_counter() - debut,
+            ))
+        if resultats.sur_sortie_standard(args):
+            return
+    print(message)
 
 
-if trouve:
-    print(f"Il y a du contentu du journal trouvé depuis {exemple_date}")
-else:
-    print(f"Aucun contenu du journal trouvé depuis {exemple_date}")
+if __name__ == '__main__':
+    main()
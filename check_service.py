@@ -1,35 +1,411 @@
 #!/usr/bin/python3
 
+# Vérifier que des processus sont en cours d'exécution.
+#
+# Sous Linux, tous les processus sont lus en une seule passe sur /proc,
+# sans lancer de commande : une passe répond à toutes les vérifications de
+# services, et donne aussi l'utilisation du CPU et de la mémoire (RSS) de
+# chaque processus, pour signaler les plus gourmands.
+#
+# Exemples :
+#   ./check_service.py
+#   ./check_service.py --service sshd=1 --service 'apache2|httpd=2-20'
+#   ./check_service.py --service nginx=1- --cpu-max 80 --rss-max 2048 --gourmands
+#   ./check_service.py --service sshd=1 --resultats -
+
 # Importer des modules dont nous avons besoin
+import argparse
+import csv
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
 from subprocess import PIPE, run
 from sys import platform
 
+import resultats
+
 # Définition des variables globales
 NOM_DE_PROCESSUS = "wuauserv"
 NOMBRE_PREVU = 1
+CPU_MAX = 90.0  # pour cent d'un cœur
+RSS_MAX = None  # Mio; pas de limite par défaut
+# Durée entre les deux relevés qui mesurent le CPU.
+INTERVALLE_CPU = 0.5
+# Un relevé précédent plus vieux que ça n'est pas réutilisé.
+AGE_MAX_RELEVE = 600
+COLONNES = (
+    'service', 'motif', 'trouves', 'prevus', 'statut', 'cpu_pct',
+    'rss_octets', 'gourmands',
+)
+COLONNES_GOURMANDS = ('pid', 'nom', 'cpu_pct', 'rss_octets')
+
+Processus = namedtuple('Processus', 'pid nom debut temps_cpu rss ligne')
+# Ce que la passe a trouvé pour un service. `prevus` est (minimum, maximum),
+# avec None pour « pas de maximum ».
+Service = namedtuple(
+    'Service', 'nom motif trouves prevus statut cpu rss gourmands',
+)
+
+# Le dernier relevé et son heure, pour mesurer le CPU depuis l'appel
+# précédent (p.ex. dans surveillance.py) sans attendre INTERVALLE_CPU.
+_dernier_releve = None
+_verrou_releve = threading.Lock()
+
+
+def commande_shell(nom):
+    # déteriminer le genre de l'OS et définir `shell_command`.
+    if platform == 'linux' or platform == 'linux2' or platform == 'darwin':
+        shell_command = "pgrep " + nom + " -c"
+    elif platform == 'win32':
+        shell_command = "sc query " + nom + " | find \"RUNNING\" /c"
+    else:
+        raise OSError(f"Ce script n'est pas compatible avec la plateforme \"{platform}\".")
+    return shell_command
+
+
+def compter_via_shell(nom):
+    # Note: this does not throw error on non-zero exit code.
+    # Cette commande nous donnera combien des processus sont en cours d'execution en chiffres.
+    completed_process = run(commande_shell(nom),  check=False, stdout=PIPE, shell=True)
+    if completed_process.returncode == 0:
+      sortie_comme_string = completed_process.stdout.decode()
+      sortie_sans_fins_de_ligne = sortie_comme_string.strip()
+      nombre_des_procs = int(sortie_sans_fins_de_ligne)
+    else:
+      nombre_des_procs = 0
+    return nombre_des_procs
+
+
+def releve_processus(lignes_de_commande=False, proc='/proc'):
+    """Lire tous les processus en une passe : {pid: Processus}.
+
+    Le temps CPU est en secondes et le RSS en octets. La ligne de
+    commande n'est lue que si `lignes_de_commande` est vrai.
+    """
+    tics = os.sysconf('SC_CLK_TCK')
+    page = os.sysconf('SC_PAGE_SIZE')
+    moi = os.getpid()
+    releve = {}
+    for entree in os.scandir(proc):
+        if not entree.name.isdigit() or int(entree.name) == moi:
+            continue
+        pid = int(entree.name)
+        try:
+            with open(f"{entree.path}/stat", 'rb') as f:
+                stat = f.read()
+            ligne = None
+            if lignes_de_commande:
+                with open(f"{entree.path}/cmdline", 'rb') as f:
+                    ligne = f.read().replace(b'\0', b' ').strip()
+                    ligne = ligne.decode(errors='replace')
+        except OSError:
+            # Le processus s'est terminé pendant la passe.
+            continue
+        # Le nom est entre parenthèses et peut en contenir.
+        debut_nom = stat.find(b'(')
+        fin_nom = stat.rfind(b')')
+        nom = stat[debut_nom + 1:fin_nom].decode(errors='replace')
+        champs = stat[fin_nom + 2:].split()
+        releve[pid] = Processus(
+            pid,
+            nom,
+            int(champs[19]),
+            (int(champs[11]) + int(champs[12])) / tics,
+            int(champs[21]) * page,
+            ligne if ligne else nom,
+        )
+    return releve
+
+
+def utilisation_cpu(avant, apres, secondes):
+    """Retourner {pid: % d'un cœur} entre deux relevés."""
+    cpu = {}
+    for pid, p in apres.items():
+        precedent = avant.get(pid)
+        if precedent is None or precedent.debut != p.debut or secondes <= 0:
+            # Nouveau processus, ou pid réutilisé.
+            cpu[pid] = 0.0
+        else:
+            cpu[pid] = 100 * (p.temps_cpu - precedent.temps_cpu) / secondes
+    return cpu
+
+
+def releve_avec_cpu(lignes_de_commande=False, intervalle=INTERVALLE_CPU):
+    """Retourner un relevé des processus et l'utilisation CPU de chacun.
+
+    Le CPU est mesuré depuis le relevé de l'appel précédent s'il est assez
+    récent, sinon sur `intervalle` secondes.
+    """
+    with _verrou_releve:
+        return _releve_avec_cpu(lignes_de_commande, intervalle)
+
+
+def _releve_avec_cpu(lignes_de_commande, intervalle):
+    global _dernier_releve
+    if (_dernier_releve is None
+            or time.monotonic() - _dernier_releve[1] > AGE_MAX_RELEVE
+            or (lignes_de_commande and not _dernier_releve[2])):
+        _dernier_releve = (
+            releve_processus(lignes_de_commande),
+            time.monotonic(),
+            lignes_de_commande,
+        )
+        time.sleep(intervalle)
+    avant, heure_avant, _ = _dernier_releve
+    apres = releve_processus(lignes_de_commande)
+    maintenant = time.monotonic()
+    _dernier_releve = (apres, maintenant, lignes_de_commande)
+    return apres, utilisation_cpu(avant, apres, maintenant - heure_avant)
+
+
+def lire_prevus(texte):
+    """Lire un nombre prévu comme "2", "2-10" ou "1-" (au moins 1)."""
+    texte = str(texte)
+    if '-' not in texte:
+        return int(texte), int(texte)
+    minimum, maximum = texte.split('-', 1)
+    return int(minimum or 0), int(maximum) if maximum else None
+
+
+def est_gourmand(pid, processus, cpu, cpu_max=CPU_MAX, rss_max=RSS_MAX):
+    if cpu_max is not None and cpu.get(pid, 0) > cpu_max:
+        return True
+    return rss_max is not None and processus.rss > rss_max * 2**20
+
+
+def verifier_services(services, cpu_max=CPU_MAX, rss_max=RSS_MAX,
+                      intervalle=INTERVALLE_CPU, ligne_complete=False):
+    """Vérifier tous les services avec une seule passe sur /proc.
+
+    `services` associe un nom (utilisé comme motif si aucun n'est donné)
+    à un nombre prévu ("2", "2-10", "1-"), ou à un dict avec les clés
+    'motif' et 'nombre'. Comme pgrep, un motif est une expression
+    régulière cherchée dans le nom du processus, ou dans toute sa ligne
+    de commande avec `ligne_complete`. Retourner la liste des Service,
+    le relevé et l'utilisation CPU de chaque processus.
+    """
+    releve, cpu = releve_avec_cpu(ligne_complete, intervalle)
+    services_trouves = []
+    for nom, attendu in services.items():
+        motif = nom
+        if isinstance(attendu, dict):
+            motif = attendu.get('motif', nom)
+            attendu = attendu.get('nombre', 1)
+        prevus = lire_prevus(attendu)
+        regex = re.compile(motif)
+        trouves = [
+            p for p in releve.values()
+            if regex.search(p.ligne if ligne_complete else p.nom)
+        ]
+        gourmands = [
+            p.pid for p in trouves
+            if est_gourmand(p.pid, p, cpu, cpu_max, rss_max)
+        ]
+        nombre = len(trouves)
+        if nombre < prevus[0] or (prevus[1] is not None and nombre > prevus[1]):  # noqa: E501
+            statut = 'alerte'
+        elif gourmands:
+            statut = 'gourmand'
+        else:
+            statut = 'ok'
+        services_trouves.append(Service(
+            nom,
+            motif,
+            nombre,
+            prevus,
+            statut,
+            round(sum((cpu.get(p.pid, 0) for p in trouves), 0.0), 1),
+            sum(p.rss for p in trouves),
+            gourmands,
+        ))
+    return services_trouves, releve, cpu
+
+
+def compter(nom):
+    """Compter les processus dont le nom correspond au motif `nom`."""
+    if os.path.isdir('/proc/self'):
+        return len([
+            p for p in releve_processus().values() if re.search(nom, p.nom)
+        ])
+    return compter_via_shell(nom)
+
+
+def verifier(nom=NOM_DE_PROCESSUS, nombre_prevu=NOMBRE_PREVU, services=None,
+             cpu_max=CPU_MAX, rss_max=RSS_MAX, intervalle=INTERVALLE_CPU):
+    """Compter des processus; retourner un statut, un message et le nombre
+    de processus trouvés.
+
+    Avec `services` (voir verifier_services()), tous les services sont
+    vérifiés en une passe. Sinon, le statut est 'alerte' si le nombre de
+    processus `nom` n'est pas `nombre_prevu`.
+    """
+    if services:
+        services_trouves, _, _ = verifier_services(services, cpu_max, rss_max, intervalle)  # noqa: E501
+        problemes = [
+            f"{s.nom}: {s.trouves} ({s.statut})"
+            for s in services_trouves if s.statut != 'ok'
+        ]
+        trouves = sum(s.trouves for s in services_trouves)
+        if problemes:
+            return 'alerte', "Services à vérifier : " + ", ".join(problemes), trouves  # noqa: E501
+        return 'ok', f"{len(services_trouves)} services OK", trouves
+
+    nombre = compter(nom)
+    return juger(nombre, nombre_prevu) + (nombre,)
+
+
+def juger(nombre_des_procs, nombre_prevu=NOMBRE_PREVU):
+    if nombre_des_procs != nombre_prevu:
+      return 'alerte', f'Nombre inattendu de processus trouvé: {nombre_des_procs}'
+    else:
+      return 'ok', "Processus trouvé!"
+
+
+def afficher_tableau(services, sortie=sys.stdout):
+    ecrivain = csv.writer(sortie, delimiter='\t', lineterminator='\n')
+    ecrivain.writerow(COLONNES)
+    for s in services:
+        minimum, maximum = s.prevus
+        if minimum == maximum:
+            prevus = minimum
+        else:
+            prevus = f"{minimum}-{'' if maximum is None else maximum}"
+        ecrivain.writerow((
+            s.nom, s.motif, s.trouves, prevus, s.statut, s.cpu, s.rss,
+            ' '.join(str(pid) for pid in s.gourmands),
+        ))
+
+
+def en_resultats(services, duree):
+    """Retourner un Resultat par service; la valeur est le nombre trouvé."""
+    horodatage = resultats.maintenant()
+    return [
+        resultats.resultat(
+            'check_service',
+            s.nom,
+            'ok' if s.statut == 'ok' else 'alerte',
+            s.trouves,
+            f"{s.statut}, cpu {s.cpu} %, rss {s.rss} octets",
+            duree,
+            horodatage,
+        )
+        for s in services
+    ]
+
+
+def afficher_gourmands(releve, cpu, cpu_max, rss_max, sortie=sys.stdout):
+    ecrivain = csv.writer(sortie, delimiter='\t', lineterminator='\n')
+    ecrivain.writerow(COLONNES_GOURMANDS)
+    gourmands = [
+        p for p in releve.values()
+        if est_gourmand(p.pid, p, cpu, cpu_max, rss_max)
+    ]
+    for p in sorted(gourmands, key=lambda p: -cpu.get(p.pid, 0)):
+        ecrivain.writerow((p.pid, p.nom, round(cpu.get(p.pid, 0), 1), p.rss))
+
+
+def service_prevu(texte):
+    motif, _, nombre = texte.rpartition('=')
+    if not motif:
+        raise argparse.ArgumentTypeError(f"MOTIF=NOMBRE attendu : {texte}")
+    try:
+        lire_prevus(nombre)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Nombre invalide : {texte}")
+    return motif, nombre
+
+
+def analyser_arguments():
+    parser = argparse.ArgumentParser(
+        description="Vérifier que des processus sont en cours d'exécution.",
+    )
+    parser.add_argument(
+        '--service', '-s', type=service_prevu, action='append', default=[],
+        metavar='MOTIF=NOMBRE',
+        help="motif du nom des processus et nombre prévu (\"2\", \"2-10\" ou \"1-\"); peut être répété",  # noqa: E501
+    )
+    parser.add_argument(
+        '--ligne-complete', action='store_true',
+        help="chercher les motifs dans toute la ligne de commande",
+    )
+    parser.add_argument(
+        '--cpu-max', type=float, default=CPU_MAX,
+        help="%% d'un cœur au-delà duquel un processus est gourmand (par défaut : %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--rss-max', type=float, default=RSS_MAX,
+        help="mémoire en Mio au-delà de laquelle un processus est gourmand",
+    )
+    parser.add_argument(
+        '--intervalle', type=float, default=INTERVALLE_CPU,
+        help="secondes de mesure du CPU (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--gourmands', action='store_true',
+        help="afficher aussi tous les processus gourmands",
+    )
+    resultats.ajouter_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = analyser_arguments()
+    if platform == 'darwin':
+        print("ATTENTION: Ce script n'est pas encore vérifié sur MacOS.")
+
+    try:
+        sortie = resultats.sortie_des_arguments(args)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        exit(1)
+
+    if not args.service and not args.gourmands:
+        debut = time.perf_counter()
+        try:
+            nombre = compter(NOM_DE_PROCESSUS)
+        except OSError as e:
+            print(e)
+            exit(1)
+        statut, message = juger(nombre)
+        if sortie:
+            with sortie:
+                sortie.ajouter(resultats.resultat(
+                    'check_service', NOM_DE_PROCESSUS, statut, nombre,
+                    message, time.perf_counter() - debut,
+                ))
+            if resultats.sur_sortie_standard(args):
+                return
+        print(message)
+        return
+
+    if not os.path.isdir('/proc/self'):
+        print("Erreur: --service et --gourmands demandent /proc (Linux).", file=sys.stderr)  # noqa: E501
+        exit(1)
+    debut = time.perf_counter()
+    services, releve, cpu = verifier_services(
+        dict(args.service),
+        args.cpu_max,
+        args.rss_max,
+        args.intervalle,
+        args.ligne_complete,
+    )
+    duree = time.perf_counter() - debut
+    if sortie:
+        with sortie:
+            sortie.ajouter_tous(en_resultats(services, duree))
+    if not resultats.sur_sortie_standard(args):
+        if services:
+            afficher_tableau(services)
+        if args.gourmands:
+            if services:
+                print()
+            afficher_gourmands(releve, cpu, args.cpu_max, args.rss_max)
+    if any(s.statut == 'alerte' for s in services):
+        exit(1)
+
 
-# déteriminer le genre de l'OS et définir `shell_command`.
-if platform == 'darwin':
-    print("ATTENTION: Ce script n'est pas encore vérifié sur MacOS.")
-if platform == 'linux' or platform == 'linux2' or platform == 'darwin':
-    shell_command = "pgrep " + NOM_DE_PROCESSUS + " -c"
-elif platform == 'win32':
-    shell_command = "sc query " + NOM_DE_PROCESSUS + " | find \"RUNNING\" /c"
-else:
-    print(f"Ce script n'est pas compatible avec la plateforme \"{platform}\".")
-    exit(1)
-
-# Note: this does not throw error on non-zero exit code.
-# Cette commande nous donnera combien des processus sont en cours d'execution en chiffres.
-completed_process = run(shell_command,  check=False, stdout=PIPE, shell=True)
-if completed_process.returncode == 0:
-  sortie_comme_string = completed_process.stdout.decode()
-  sortie_sans_fins_de_ligne = sortie_comme_string.strip()
-  nombre_des_procs = int(sortie_sans_fins_de_ligne)
-else:
-  nombre_des_procs = 0
-
-if nombre_des_procs != NOMBRE_PREVU:
-  print(f'Nombre inattendu de processus trouvé: {nombre_des_procs}')
-else:
-  print("Processus trouvé!")	
+if __name__ == '__main__':
+    main()
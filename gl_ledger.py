@@ -0,0 +1,236 @@
+""" Combined ledger of an account's entries from the monthly GL CSV files.
+
+Each month's GL report repeats the earlier months of its quarter, so the
+monthly CSV files overlap. The combined ledger holds each entry once, in
+date order, and is updated from only the CSV files that are new since the
+last update.
+"""
+
+import csv
+import hashlib
+import heapq
+import itertools
+import json
+from pathlib import Path
+
+from glpdf2csv import DEFAULT_ACCOUNT
+from glpdf2csv import output_file_name
+
+# Bump when a change to the entry keys or file layout makes ledgers stale.
+LEDGER_VERSION = 2
+MONTHS = {
+    m: i for i, m in enumerate(
+        ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+         'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'),
+        start=1,
+    )
+}
+
+
+def entry_key(row):
+    """Return a short, stable digest of all the fields of a GL entry row."""
+    data = '\x1f'.join(row).encode()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def entry_date(row):
+    """Return a sortable (year, month, day) for the row's "%d-%b-%y" date."""
+    try:
+        day, month, year = row[0].split('-')
+        return (2000 + int(year), MONTHS[month], int(day))
+    except (IndexError, KeyError, ValueError):
+        raise ValueError(f"Unrecognized GL entry date: {row[:1]}")
+
+
+def file_signature(file_path_obj):
+    stat = file_path_obj.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def iter_csv_rows(csv_file):
+    with csv_file.open(newline='') as f:
+        for row in csv.reader(f):
+            if row:
+                yield row
+
+
+class Ledger:
+    """An account's GL entries from all of a folder's monthly CSV files.
+
+    The ledger is "CAR <account>, combined.csv" in the folder, the file
+    that `glpdf2csv.py --format append` adds to. An index file beside it
+    records the size and mtime of each CSV file already read, and a keys
+    folder holds the key of each entry in the ledger, in one file per month,
+    so update() only reads new CSV files and skips the entries they repeat.
+    Since a repeated entry has the same date, only the keys of the months in
+    the new files are read. New entries are appended, or merged in if any
+    are dated before the end of the ledger.
+
+    The ledger is rebuilt from all the CSV files if one of them changes or
+    is removed, and re-sorted if rows were appended to it by another tool.
+    """
+
+    def __init__(self, folder, account_name=None):
+        self.folder = Path(folder)
+        self.account_name = account_name or DEFAULT_ACCOUNT
+        name = output_file_name(None, self.account_name, 'append')
+        self.file = self.folder / name
+        self.index_file = self.file.with_suffix('.json')
+        self.keys_dir = self.file.with_suffix('.keys')
+
+    def source_files(self):
+        name = self.account_name.replace('/', '-')
+        return sorted(self.folder.glob(f"* CAR {name}.csv"))
+
+    def update(self):
+        """Add the entries of new CSV files; return how many were added.
+
+        If the ledger had to be rebuilt, all of its entries count as added.
+        """
+        sources = {str(f): file_signature(f) for f in self.source_files()}
+        index = self._load_index()
+        if index is None or not (self.file.is_file() and self.keys_dir.is_dir()):  # noqa: E501
+            return self.rebuild(sources)
+        old_sources = index['sources']
+        if any(sources.get(f) != sig for f, sig in old_sources.items()):
+            # Entries may have been changed or removed.
+            return self.rebuild(sources)
+        new_files = [Path(f) for f in sources if f not in old_sources]
+        size, mtime_ns = file_signature(self.file)
+        if size < index['ledger'][0] or (
+            size == index['ledger'][0] and mtime_ns != index['ledger'][1]
+        ):
+            return self.rebuild(sources)
+        if size > index['ledger'][0]:
+            # Rows were appended by something else; they may be out of order.
+            rows = itertools.chain(
+                iter_csv_rows(self.file),
+                *(iter_csv_rows(f) for f in new_files),
+            )
+            return self._rewrite(rows, sources) - index['rows']
+        if not new_files:
+            return 0
+
+        rows = [row for f in new_files for row in iter_csv_rows(f)]
+        keys = self._load_keys({entry_date(row)[:2] for row in rows})
+        new_rows = []
+        for row in rows:
+            key = entry_key(row)
+            if key not in keys:
+                keys.add(key)
+                new_rows.append((key, row))
+        if new_rows:
+            new_rows.sort(key=lambda kr: entry_date(kr[1]))
+            last_date = tuple(index['last_date'] or (0, 0, 0))
+            if entry_date(new_rows[0][1]) >= last_date:
+                self._append(new_rows)
+            else:
+                self._merge(new_rows)
+        index['sources'] = sources
+        index['rows'] += len(new_rows)
+        if new_rows:
+            index['last_date'] = max(
+                tuple(index['last_date'] or (0, 0, 0)),
+                entry_date(new_rows[-1][1]),
+            )
+        index['ledger'] = file_signature(self.file)
+        self._save_index(index)
+        return len(new_rows)
+
+    def rebuild(self, sources=None):
+        """Write the ledger again from all the CSV files; return its length."""
+        if sources is None:
+            sources = {str(f): file_signature(f) for f in self.source_files()}
+        rows = (r for f in sources for r in iter_csv_rows(Path(f)))
+        return self._rewrite(rows, sources)
+
+    def _rewrite(self, rows, sources):
+        keyed_rows = {}
+        for row in rows:
+            keyed_rows.setdefault(entry_key(row), row)
+        # sorted() is stable, so entries on the same date keep their order.
+        ordered = sorted(keyed_rows.items(), key=lambda kr: entry_date(kr[1]))
+        tmp_file = self.file.with_name(f"{self.file.name}.tmp")
+        with tmp_file.open('w', newline='') as f:
+            csv.writer(f).writerows(row for _, row in ordered)
+        tmp_file.replace(self.file)
+        self._write_keys(ordered, 'w')
+        self._save_index({
+            'version': LEDGER_VERSION,
+            'account': self.account_name,
+            'sources': sources,
+            'ledger': file_signature(self.file),
+            'last_date': entry_date(ordered[-1][1]) if ordered else None,
+            'rows': len(ordered),
+        })
+        return len(ordered)
+
+    def _append(self, keyed_rows):
+        with self.file.open('a', newline='') as f:
+            csv.writer(f).writerows(row for _, row in keyed_rows)
+        self._write_keys(keyed_rows, 'a')
+
+    def _merge(self, keyed_rows):
+        # Both inputs are in date order, and on equal dates merge() takes
+        # existing entries first, as appending them later would.
+        merged = heapq.merge(
+            iter_csv_rows(self.file),
+            (row for _, row in keyed_rows),
+            key=entry_date,
+        )
+        tmp_file = self.file.with_name(f"{self.file.name}.tmp")
+        with tmp_file.open('w', newline='') as f:
+            csv.writer(f).writerows(merged)
+        tmp_file.replace(self.file)
+        self._write_keys(keyed_rows, 'a')
+
+    def _load_index(self):
+        try:
+            with self.index_file.open() as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(index, dict):
+            return None
+        if index.get('version') != LEDGER_VERSION:
+            return None
+        if index.get('account') != self.account_name:
+            return None
+        return index
+
+    def _save_index(self, index):
+        # Written last, so it never describes a ledger that wasn't finished.
+        tmp_file = self.index_file.with_name(f"{self.index_file.name}.tmp")
+        with tmp_file.open('w') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        tmp_file.replace(self.index_file)
+
+    def _keys_file(self, month):
+        year, month = month
+        return self.keys_dir / f"{year:04}-{month:02}"
+
+    def _load_keys(self, months):
+        """Return the keys of the ledger's entries dated in these months."""
+        keys = set()
+        for month in months:
+            try:
+                with self._keys_file(month).open() as f:
+                    keys.update(f.read().split())
+            except FileNotFoundError:
+                pass
+        return keys
+
+    def _write_keys(self, keyed_rows, mode):
+        if mode == 'w':
+            if self.keys_dir.is_file():
+                # A keys file from an older ledger version.
+                self.keys_dir.unlink()
+            self.keys_dir.mkdir(exist_ok=True)
+            for f in self.keys_dir.iterdir():
+                f.unlink()
+        by_month = {}
+        for key, row in keyed_rows:
+            by_month.setdefault(entry_date(row)[:2], []).append(key)
+        for month, keys in by_month.items():
+            with self._keys_file(month).open('a') as f:
+                f.writelines(f"{key}\n" for key in keys)
@@ -4,13 +4,31 @@
     (default: "Bangui Internet: Communications")
 """
 
+import argparse
+import atexit
 import csv
 import pdftotext
 import re
-import sys
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
 from pathlib import Path
 
+from profiling import PROFILER
+from profiling import add_profile_args
+from profiling import call_profiled
+
+DEFAULT_ACCOUNT = "Bangui Internet: Communications"
+# An account's header line, followed by its block of GLJE entry lines.
+ACCOUNT_HEADER_RE = re.compile(
+    r' *\d{5}-R51057 +(?P<account>.+?)\s+Beginning Balance'
+)
+ACCOUNT_ENTRY_RE = re.compile(r' *GLJE.')
+# The 1st 3 columns of an entry line, and the gaps between columns.
+GLJE_PREFIX_RE = re.compile(r' *GLJE +[0-9]{6} +[0-9]{2} +')
+COLUMN_SEP_RE = re.compile(r' {2,}|\t')
+OUTPUT_FORMATS = ('csv', 'tsv', 'append')
+
 
 def get_date_from_file_name(pdf_file_path_obj):
     file_name = pdf_file_path_obj.name
@@ -18,88 +36,290 @@ def get_date_from_file_name(pdf_file_path_obj):
     if m:
         date = m[0]
     else:
-        print("Error: Filename doesn't start with 4 digits.")
-        exit(1)
+        raise ValueError(f"Filename doesn't start with 4 digits: {file_name}")
     return date
 
 
-def text_from_pdf(pdf_file_path_obj):
+def iter_pdf_pages(pdf_file_path_obj):
+    """Yield the text of each page, extracting pages only as they're needed."""
     print(f"Reading: {pdf_file_path_obj.name}")
     with pdf_file_path_obj.open('rb') as f:
-        pdf_pgs = pdftotext.PDF(f)
+        with PROFILER.stage('pdftotext'):
+            pdf = pdftotext.PDF(f)
+        for i in range(len(pdf)):
+            with PROFILER.stage('pdftotext'):
+                page = pdf[i]
+            yield page
+
+
+def text_from_pdf(pdf_file_path_obj):
+    return '\n'.join(iter_pdf_pages(pdf_file_path_obj))
+
+
+def iter_report_lines(pages):
+    """Yield the lines of '\n'.join(pages) without building the joined text.
+
+    A line left unfinished at the end of a page is carried over to the next
+    one. A final line with no line ending is dropped, as it can't match.
+    """
+    carry = None
+    for page in pages:
+        if carry is not None:
+            page = f"{carry}\n{page}"
+        lines = page.split('\n')
+        carry = lines.pop()
+        yield from lines
+
 
-    plain_text = '\n'.join(pdf_pgs)
-    return plain_text
+def iter_accounts_entries(lines, account_names=None):
+    """Yield (account name, entry line) for each GLJE line in lines.
+
+    If account_names is None, entries for every account are yielded.
+    """
+    if account_names is not None:
+        account_names = set(account_names)
+    account = None
+    for line in lines:
+        if account is not None and ACCOUNT_ENTRY_RE.match(line):
+            if account_names is None or account in account_names:
+                yield account, line
+            continue
+        # Any other line ends the current account block.
+        account = None
+        m = ACCOUNT_HEADER_RE.match(line)
+        if m:
+            account = m['account']
+
+
+def collect_accounts_entries(lines, account_names=None):
+    """Return a dict of each account's entry lines.
+
+    If account_names is None, every account found in lines is included.
+    """
+    accounts_entry_lines = {}
+    if account_names is not None:
+        accounts_entry_lines = {name: [] for name in account_names}
+    for name, line in iter_accounts_entries(lines, account_names):
+        accounts_entry_lines.setdefault(name, []).append(line)
+    for name, entry_lines in accounts_entry_lines.items():
+        if len(entry_lines) == 0:
+            print(f"No data found for: {name}")
+    return accounts_entry_lines
+
+
+def filter_accounts_entries(report_text, account_names=None):
+    return collect_accounts_entries(
+        iter_report_lines([report_text]),
+        account_names,
+    )
 
 
 def filter_account_entries(report_text, full_account_name):
-    expr = rf'^ *\d{{5}}-R51057 +{full_account_name}\s+Beginning Balance.*\n((?: *GLJE.+\n)+)'  # noqa: E501
-    account_text_results_pgs = re.findall(expr, report_text, flags=re.MULTILINE)  # noqa: E501
-    account_entry_lines = []
-    if len(account_text_results_pgs) == 0:
-        print(f"No data found for: {full_account_name}")
-        return account_entry_lines
-
-    for pg in account_text_results_pgs:
-        account_entry_lines.extend(pg.split('\n'))
-    # Remove empty lines.
-    account_entry_lines = [ln for ln in account_entry_lines if len(ln) > 0]
-    # account_entry_lines = account_text_results[0].split('\n')
-    return account_entry_lines
-
-
-def write_lines_to_csv(lines, csv_file_path_obj):
+    accounts_entry_lines = filter_accounts_entries(
+        report_text,
+        [full_account_name],
+    )
+    return accounts_entry_lines[full_account_name]
+
+
+def line_to_row(line):
     # Strip 1st 3 columns.
-    stripped_lines = []
-    expr = r' *GLJE +[0-9]{6} +[0-9]{2} +'
-    for line in lines:
-        stripped_lines.append(re.sub(expr, '', line))
-    # Convert multiple spaces to tabs.
-    tabbed_lines = []
-    col_sep_expr = r' {2,}'
-    for line in stripped_lines:
-        tabbed_lines.append(re.sub(col_sep_expr, '\t', line))
-    # # Only keep last 6 columns.
-    # filtered_tabbed_lines = []
-    # for line in tabbed_lines:
-    #     print(line)
-    #     columns = line.split('\t')
-    #     filtered_tabbed_lines.append('\t'.join(columns[-6:]))
-    # Write to CSV.
-    # global csv
-    csv_rows = csv.reader(tabbed_lines, delimiter='\t')
-    with csv_file_path_obj.open('w') as f:
-        csvw = csv.writer(f)
-        csvw.writerows(csv_rows)
+    line = GLJE_PREFIX_RE.sub('', line)
+    if not line:
+        return []
+    if '"' in line:
+        # Let csv handle quoted fields, as it always has.
+        return next(csv.reader([COLUMN_SEP_RE.sub('\t', line)], delimiter='\t'))  # noqa: E501
+    # Split columns on multiple spaces.
+    return COLUMN_SEP_RE.split(line)
 
 
-def pdf_to_csv(pdf_file, account_name=None, outdir=None):
+def write_lines_to_csv(lines, csv_file_path_obj, fmt='csv'):
+    """Write entry lines as rows, one at a time, and return the row count.
+
+    lines can be any iterable, e.g. a generator. fmt is one of
+    OUTPUT_FORMATS: 'csv', 'tsv', or 'append' to add CSV rows to the end of
+    an existing file such as a combined ledger (rows aren't deduplicated).
+    """
+    mode = 'a' if fmt == 'append' else 'w'
+    delimiter = '\t' if fmt == 'tsv' else ','
+    count = 0
+    with csv_file_path_obj.open(mode) as f:
+        csvw = csv.writer(f, delimiter=delimiter)
+        for line in lines:
+            csvw.writerow(line_to_row(line))
+            count += 1
+    return count
+
+
+def output_file_name(date, account_name, fmt='csv'):
+    # Account names can include "/", which isn't allowed in filenames.
+    name = account_name.replace('/', '-')
+    if fmt == 'append':
+        return f"CAR {name}, combined.csv"
+    return f"{date} CAR {name}.{fmt}"
+
+
+def pdf_to_csvs(pdf_file, account_names=None, outdir=None, fmt='csv'):
+    """Write one CSV per account from a single read of the PDF.
+
+    If account_names is None, every account found in the report is written.
+    fmt is passed on to write_lines_to_csv(); with 'append', each account's
+    rows are added to its combined ledger in outdir. Returns a dict of the
+    file written for each account (None if the account had no entries).
+    """
     pdfobj = Path(pdf_file)
     date = get_date_from_file_name(pdfobj)
-    if not account_name:
-        account_name = "Bangui Internet: Communications"
-
-    csv_filename = f"{date} CAR {account_name}.csv"
     if not outdir:
         csv_parent = pdfobj.parent
     else:
         csv_parent = Path(outdir)
-    csv_file = csv_parent / csv_filename
-    text = text_from_pdf(pdfobj)
-    account_entry_lines = filter_account_entries(text, account_name)
-    if account_entry_lines:
-        write_lines_to_csv(account_entry_lines, csv_file)
+    # Only the current page and the matching entry lines are kept in memory.
+    lines = iter_report_lines(iter_pdf_pages(pdfobj))
+    # Pages are extracted as they're read, under the 'pdftotext' stage.
+    with PROFILER.stage('filter'):
+        accounts_entry_lines = collect_accounts_entries(lines, account_names)
+    csv_files = {}
+    for account_name, lines in accounts_entry_lines.items():
+        if not lines:
+            csv_files[account_name] = None
+            continue
+        csv_file = csv_parent / output_file_name(date, account_name, fmt)
+        with PROFILER.stage('write_csv'):
+            write_lines_to_csv(lines, csv_file, fmt)
+        csv_files[account_name] = csv_file
+    return csv_files
+
+
+def pdf_to_csv(pdf_file, account_name=None, outdir=None):
+    if not account_name:
+        account_name = DEFAULT_ACCOUNT
+    return pdf_to_csvs(pdf_file, [account_name], outdir)[account_name]
+
+
+def find_pdfs(paths, pattern='*.pdf'):
+    """Expand directories in paths to the PDFs they contain."""
+    pdf_files = []
+    for p in paths:
+        p = Path(p).expanduser().resolve()
+        if p.is_dir():
+            pdf_files.extend(sorted(p.glob(pattern)))
+        else:
+            pdf_files.append(p)
+    return pdf_files
+
+
+def pdfs_to_csv(pdf_files, account_names=None, outdir=None, jobs=None, fmt='csv'):  # noqa: E501
+    """Convert several GL reports to CSV, using up to `jobs` processes.
+
+    Returns two dicts keyed by PDF path: the pdf_to_csvs() result for each
+    converted PDF, and the exception raised by each PDF that failed. One
+    failure doesn't stop the batch.
+    """
+    pdf_files = [Path(p) for p in pdf_files]
+    results = {}
+    errors = {}
+    # Appending to shared ledgers from several processes could mix rows.
+    if jobs == 1 or len(pdf_files) < 2 or fmt == 'append':
+        for p in pdf_files:
+            try:
+                results[p] = pdf_to_csvs(p, account_names, outdir, fmt)
+            except Exception as e:
+                errors[p] = e
+        return results, errors
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if PROFILER.enabled:
+            futures = {
+                executor.submit(
+                    call_profiled, pdf_to_csvs, p, account_names, outdir, fmt,
+                ): p
+                for p in pdf_files
+            }
+        else:
+            futures = {
+                executor.submit(pdf_to_csvs, p, account_names, outdir, fmt): p
+                for p in pdf_files
+            }
+        for future in as_completed(futures):
+            p = futures[future]
+            try:
+                results[p] = future.result()
+            except Exception as e:
+                errors[p] = e
+                continue
+            if PROFILER.enabled:
+                results[p], stages = results[p]
+                PROFILER.merge(stages)
+    return results, errors
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+    )
+    parser.add_argument(
+        'paths', nargs='+', metavar='PATH',
+        help="GL report PDF, or folder of GL report PDFs",
+    )
+    parser.add_argument(
+        '--account', '-a', action='append', dest='accounts',
+        metavar='ACCOUNT',
+        help=f"full account name; can be repeated (default: \"{DEFAULT_ACCOUNT}\")",  # noqa: E501
+    )
+    parser.add_argument(
+        '--all-accounts', action='store_true',
+        help="write a CSV for every account found in each report",
+    )
+    parser.add_argument(
+        '--format', '-f', choices=OUTPUT_FORMATS, default='csv',
+        dest='fmt',
+        help="write CSV or TSV files per report, or append CSV rows to each account's combined ledger (default: %(default)s)",  # noqa: E501
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=1, metavar='N',
+        help="convert up to N PDFs in parallel (0: one per CPU)",
+    )
+    parser.add_argument(
+        '--outdir', '-o',
+        help="folder for CSV files (default: same folder as each PDF)",
+    )
+    parser.add_argument(
+        '--pattern', default='*.pdf',
+        help="filename pattern for PDFs in folders (default: %(default)s)",
+    )
+    add_profile_args(parser)
+    args = parser.parse_args()
+    # Support the older "/PATH/TO/PDF ACCOUNT" usage.
+    if len(args.paths) == 2 and not args.accounts and not Path(args.paths[1]).exists():  # noqa: E501
+        args.accounts = [args.paths.pop()]
+    return args
 
 
 def main():
-    if sys.argv[1] in ['-h', '--help']:
-        print(f"usage: {sys.argv[0]} /PATH/TO/PDF")
-        exit()
-    pdf_file = Path(sys.argv[1]).expanduser().resolve()
-    account_name = None
-    if len(sys.argv) > 2:
-        account_name = sys.argv[2]
-    pdf_to_csv(pdf_file, account_name=account_name)
+    args = parse_cli()
+    if args.profile or args.profile_json or args.profile_dir:
+        PROFILER.enable(args.profile_dir)
+        atexit.register(PROFILER.report, args.profile_json)
+    pdf_files = find_pdfs(args.paths, args.pattern)
+    jobs = args.jobs if args.jobs > 0 else None
+    account_names = args.accounts or [DEFAULT_ACCOUNT]
+    if args.all_accounts:
+        account_names = None
+    results, errors = pdfs_to_csv(
+        pdf_files,
+        account_names=account_names,
+        outdir=args.outdir,
+        jobs=jobs,
+        fmt=args.fmt,
+    )
+    for p, e in sorted(errors.items()):
+        print(f"Error: {p.name}: {e}")
+    if len(pdf_files) > 1:
+        written = len([r for r in results.values() if any(r.values())])
+        print(f"Converted {written} of {len(pdf_files)} PDFs.")
+    if errors:
+        exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,179 @@
+""" Per-stage timing and memory use for the report scripts.
+
+Wrap each stage of a run in `with PROFILER.stage(name):`. Nothing is
+recorded unless PROFILER.enable() has been called (e.g. by --profile).
+"""
+
+import cProfile
+import json
+import sys
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS isn't reported there.
+    resource = None
+
+
+def peak_rss():
+    """Return this process's peak resident set size so far, in bytes."""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Profiler:
+    """Record wall time, CPU time and peak RSS for named stages.
+
+    A stage can run many times and stages can be nested; the times recorded
+    for a stage exclude the time spent in the stages nested inside it.
+    "rss_growth" is how much the process's peak RSS rose during the stage,
+    and "peak_rss" is the highest peak RSS seen when the stage ended.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile_dir = None
+        self.stages = {}
+        self._profiles = {}
+        self._stack = []
+
+    def enable(self, cprofile_dir=None):
+        self.enabled = True
+        if cprofile_dir:
+            self.cprofile_dir = Path(cprofile_dir)
+            self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+
+    def reset(self):
+        self.stages = {}
+        self._profiles = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        parent = self._stack[-1] if self._stack else None
+        frame = {'wall': 0.0, 'cpu': 0.0, 'rss': 0, 'profile': None}
+        if self.cprofile_dir:
+            # Only one cProfile.Profile can be active at a time.
+            if parent and parent['profile']:
+                parent['profile'].disable()
+            frame['profile'] = self._profiles.setdefault(
+                name,
+                cProfile.Profile(),
+            )
+            frame['profile'].enable()
+        self._stack.append(frame)
+        rss_start = peak_rss()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss = peak_rss()
+            if frame['profile']:
+                frame['profile'].disable()
+            self._stack.pop()
+            if parent:
+                parent['wall'] += wall
+                parent['cpu'] += cpu
+                parent['rss'] += rss - rss_start
+                if parent['profile']:
+                    parent['profile'].enable()
+            self.add(name, {
+                'calls': 1,
+                'wall': wall - frame['wall'],
+                'cpu': cpu - frame['cpu'],
+                'rss_growth': rss - rss_start - frame['rss'],
+                'peak_rss': rss,
+            })
+
+    def add(self, name, record):
+        totals = self.stages.setdefault(name, {
+            'calls': 0,
+            'wall': 0.0,
+            'cpu': 0.0,
+            'rss_growth': 0,
+            'peak_rss': 0,
+        })
+        for key in ('calls', 'wall', 'cpu', 'rss_growth'):
+            totals[key] += record[key]
+        totals['peak_rss'] = max(totals['peak_rss'], record['peak_rss'])
+
+    def merge(self, stages):
+        """Add stage records from another process, e.g. a pool worker."""
+        for name, record in stages.items():
+            self.add(name, record)
+
+    def summary(self):
+        lines = [
+            f"{'stage':<28} {'calls':>6} {'wall s':>9} {'cpu s':>9} "
+            f"{'+RSS MB':>8} {'peak MB':>8}"
+        ]
+        ranked = sorted(self.stages.items(), key=lambda s: -s[1]['wall'])
+        for name, r in ranked:
+            lines.append(
+                f"{name:<28} {r['calls']:>6} {r['wall']:>9.3f} "
+                f"{r['cpu']:>9.3f} {r['rss_growth'] / 2**20:>8.1f} "
+                f"{r['peak_rss'] / 2**20:>8.1f}"
+            )
+        return '\n'.join(lines)
+
+    def report(self, json_file=None):
+        """Print the summary table, and save it and any cProfile dumps."""
+        print(f"\n{self.summary()}", file=sys.stderr)
+        if json_file:
+            with open(json_file, 'w') as f:
+                json.dump(self.stages, f, indent=2, sort_keys=True)
+        if self.cprofile_dir:
+            for name, profile in self._profiles.items():
+                profile.dump_stats(self.cprofile_dir / f"{name}.prof")
+
+
+PROFILER = Profiler()
+
+
+def call_profiled(func, *args):
+    """Run func with profiling on and return its result and stage records.
+
+    For use in pool workers, whose records the parent then merges.
+    """
+    # A forked worker inherits the cProfile hook of the parent's current
+    # stage; turn it off so it doesn't slow the worker down.
+    for frame in PROFILER._stack:
+        if frame['profile']:
+            frame['profile'].disable()
+    sys.setprofile(None)
+    PROFILER.reset()
+    # A forked worker inherits the parent's --profile-dir, but only the
+    # parent writes cProfile dumps.
+    PROFILER.cprofile_dir = None
+    PROFILER.enable()
+    result = func(*args)
+    return result, PROFILER.stages
+
+
+def add_profile_args(parser):
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="print time, CPU time and peak memory used by each stage",
+    )
+    parser.add_argument(
+        '--profile-json', metavar='FILE',
+        help="also save the --profile results to FILE as JSON",
+    )
+    parser.add_argument(
+        '--profile-dir', metavar='DIR',
+        help="also save a cProfile dump of each stage to DIR",
+    )
@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+
+# Résultats des vérifications, dans une forme commune à tous les check_*.py.
+#
+# Un Resultat donne le nom de la vérification, sa cible (hôte, montage,
+# service, journal), son statut, une valeur mesurée, un message, sa durée et
+# son heure. Les sorties gardent les résultats en mémoire et les écrivent par
+# lots, en lignes JSON, en CSV ou dans une base SQLite, pour qu'une
+# vérification fréquente ne paie pas une écriture (ou un processus) par
+# résultat.
+#
+# Exemples :
+#   ./check_address.py 192.168.1.0/24 --resultats resultats.sqlite
+#   ./check_disk.py --tous --resultats - | collecteur
+#   ./surveillance.py --resultats ~/surveillance.jsonl
+
+# Importer des modules dont nous avons besoin
+import csv
+import json
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+# Définition des variables globales
+COLONNES = (
+    'verification', 'cible', 'statut', 'valeur', 'message', 'duree',
+    'horodatage',
+)
+# Un lot est écrit quand il a TAILLE_LOT résultats, ou quand le plus vieux
+# attend depuis DELAI_MAX secondes.
+TAILLE_LOT = 100
+DELAI_MAX = 5
+EXTENSIONS = {
+    '.jsonl': 'jsonl',
+    '.json': 'jsonl',
+    '.csv': 'csv',
+    '.sqlite': 'sqlite',
+    '.sqlite3': 'sqlite',
+    '.db': 'sqlite',
+}
+
+# `valeur` est la mesure principale (latence en ms, part du disque utilisée,
+# nombre de processus...), ou None. `duree` est en secondes.
+Resultat = namedtuple('Resultat', COLONNES)
+
+
+def maintenant():
+    """Retourner l'heure actuelle en ISO 8601, avec le fuseau."""
+    return datetime.now().astimezone().isoformat(timespec='milliseconds')
+
+
+def resultat(verification, cible, statut, valeur=None, message='',
+             duree=None, horodatage=None):
+    """Créer un Resultat; l'heure par défaut est maintenant."""
+    if duree is not None:
+        duree = round(duree, 6)
+    return Resultat(
+        verification, str(cible), statut, valeur, message, duree,
+        horodatage or maintenant(),
+    )
+
+
+class Sortie:
+    """Garder des résultats en mémoire et les écrire par lots.
+
+    Les sous-classes définissent _ecrire(lot) et, si besoin, fermer().
+    """
+
+    def __init__(self, chemin, taille_lot=TAILLE_LOT, delai_max=DELAI_MAX):
+        self.chemin = chemin
+        self.taille_lot = taille_lot
+        self.delai_max = delai_max
+        self.lot = []
+        self.debut_lot = None
+
+    def ajouter(self, resultat):
+        if not self.lot:
+            self.debut_lot = time.monotonic()
+        self.lot.append(resultat)
+        if (len(self.lot) >= self.taille_lot
+                or time.monotonic() - self.debut_lot >= self.delai_max):
+            self.vider()
+
+    def ajouter_tous(self, resultats):
+        for r in resultats:
+            self.ajouter(r)
+
+    def en_retard(self):
+        """Le lot attend-il depuis plus de delai_max secondes ?"""
+        return bool(self.lot) and time.monotonic() - self.debut_lot >= self.delai_max  # noqa: E501
+
+    def vider(self):
+        """Écrire le lot actuel."""
+        if self.lot:
+            self._ecrire(self.lot)
+            self.lot = []
+
+    def _ecrire(self, lot):
+        raise NotImplementedError
+
+    def fermer(self):
+        self.vider()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+class SortieFichier(Sortie):
+    """Une sortie texte; le chemin "-" est la sortie standard."""
+
+    def __init__(self, chemin, *args, **kwargs):
+        super().__init__(chemin, *args, **kwargs)
+        if str(chemin) == '-':
+            self.fichier = sys.stdout
+        else:
+            self.fichier = open(chemin, 'a', encoding='UTF-8', newline='')
+
+    def fermer(self):
+        super().fermer()
+        if self.fichier is not sys.stdout:
+            self.fichier.close()
+
+
+class SortieJsonl(SortieFichier):
+    """Un objet JSON par ligne."""
+
+    def _ecrire(self, lot):
+        self.fichier.write(''.join(
+            json.dumps(r._asdict(), ensure_ascii=False) + '\n' for r in lot
+        ))
+        self.fichier.flush()
+
+
+class SortieCsv(SortieFichier):
+    """Un fichier CSV; l'entête est écrite si le fichier est vide."""
+
+    def __init__(self, chemin, *args, **kwargs):
+        super().__init__(chemin, *args, **kwargs)
+        self.ecrivain = csv.writer(self.fichier, lineterminator='\n')
+        if self.fichier is sys.stdout or self.fichier.tell() == 0:
+            self.ecrivain.writerow(COLONNES)
+
+    def _ecrire(self, lot):
+        self.ecrivain.writerows(
+            ['' if v is None else v for v in r] for r in lot
+        )
+        self.fichier.flush()
+
+
+class SortieSqlite(Sortie):
+    """Une table `resultats` dans une base SQLite; un lot par transaction."""
+
+    def __init__(self, chemin, *args, **kwargs):
+        super().__init__(chemin, *args, **kwargs)
+        self.connexion = sqlite3.connect(chemin)
+        # Le journal WAL évite de réécrire la base à chaque transaction, et
+        # permet de la lire pendant la surveillance.
+        self.connexion.execute("PRAGMA journal_mode=WAL")
+        self.connexion.execute("PRAGMA synchronous=NORMAL")
+        with self.connexion:
+            self.connexion.execute(
+                "CREATE TABLE IF NOT EXISTS resultats ("
+                "verification TEXT, cible TEXT, statut TEXT, valeur, "
+                "message TEXT, duree REAL, horodatage TEXT)"
+            )
+            self.connexion.execute(
+                "CREATE INDEX IF NOT EXISTS resultats_verification "
+                "ON resultats (verification, horodatage)"
+            )
+
+    def _ecrire(self, lot):
+        with self.connexion:
+            self.connexion.executemany(
+                "INSERT INTO resultats VALUES (?, ?, ?, ?, ?, ?, ?)", lot,
+            )
+
+    def fermer(self):
+        super().fermer()
+        self.connexion.close()
+
+
+FORMATS = {
+    'jsonl': SortieJsonl,
+    'csv': SortieCsv,
+    'sqlite': SortieSqlite,
+}
+
+
+def ouvrir_sortie(chemin, format=None, taille_lot=TAILLE_LOT,
+                  delai_max=DELAI_MAX):
+    """Ouvrir une sortie; le format vient de l'extension s'il n'est pas donné.
+
+    Le chemin "-" écrit des lignes JSON (ou du CSV) sur la sortie standard.
+    """
+    if format is None:
+        if str(chemin) == '-':
+            format = 'jsonl'
+        else:
+            format = EXTENSIONS.get(Path(chemin).suffix.lower())
+        if format is None:
+            raise ValueError(f"Format de résultats inconnu pour {chemin} ; utiliser {', '.join(FORMATS)}")  # noqa: E501
+    if format == 'sqlite' and str(chemin) == '-':
+        raise ValueError("Le format sqlite demande un fichier")
+    try:
+        return FORMATS[format](chemin, taille_lot, delai_max)
+    except sqlite3.Error as e:
+        raise OSError(f"Base de résultats illisible : {chemin} : {e}")
+
+
+def ajouter_arguments(parser):
+    """Ajouter --resultats et --format-resultats à un analyseur argparse."""
+    parser.add_argument(
+        '--resultats', metavar='CHEMIN',
+        help="écrire aussi les résultats dans CHEMIN (.jsonl, .csv ou .sqlite), ou en lignes JSON sur la sortie standard avec \"-\"",  # noqa: E501
+    )
+    parser.add_argument(
+        '--format-resultats', choices=FORMATS,
+        help="format de --resultats, s'il ne vient pas de l'extension",
+    )
+
+
+def sortie_des_arguments(args):
+    """Retourner la sortie demandée par --resultats, ou None."""
+    if not args.resultats:
+        return None
+    return ouvrir_sortie(args.resultats, args.format_resultats)
+
+
+def sur_sortie_standard(args):
+    """Les résultats vont-ils sur la sortie standard ?
+
+    Dans ce cas, les scripts n'y affichent pas leurs messages habituels.
+    """
+    return args.resultats == '-'
@@ -1,12 +1,53 @@
 #!/usr/bin/env python3
 
 import argparse
+import atexit
+import hashlib
+import json
 import locale
 import matplotlib.pyplot as plt
+import os
 import pandas as pd
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-
-from glpdf2csv import pdf_to_csv
+from PIL import Image
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+from glpdf2csv import DEFAULT_ACCOUNT
+from glpdf2csv import pdfs_to_csv
+from gl_ledger import Ledger
+from profiling import PROFILER
+from profiling import add_profile_args
+from profiling import call_profiled
+from session_rollups import SessionRollups
+
+MANIFEST_NAME = "GL conversion manifest.json"
+ROLLUPS_NAME = "Session rollups.sqlite"
+# Bump when a change to parsing or cleaning makes cached frames stale.
+CACHE_VERSION = 1
+PERSISTED_FRAMES = ('raw_sessions', 'clean_modem_expenses')
+# Bump when a change to the plot functions should remake unchanged charts.
+CHART_VERSION = 1
+STYLE = 'bmh'
+# pandas resample rules for each --daily/--weekly/--yearly period.
+RESAMPLE_RULES = {'daily': 'D', 'weekly': 'W', 'monthly': 'M', 'yearly': 'Y'}
+# Charts made by --all, named after their command-line options.
+CHART_NAMES = ('hourly_modem_cost', 'local', 'modem_rate', 'remote', 'teams')
+# Other ways teams are named in GL entry descriptions, e.g.:
+#   "Mbati": "Mbati Bible Translation",
+TEAM_ALIASES = {}
+# Teams whose hours aren't attributed to team budgets.
+EXCLUDED_TEAMS = (
+    "IT and Language Technology services, ACATBA",
+)
 
 # style = 'ggplot'
 # style = 'bmh'
@@ -25,6 +66,14 @@ def parse_cli():
         '--all', action='store_true',
         help="produce all configured charts",
     )
+    parser.add_argument(
+        '--force', '-f', action='store_true',
+        help="remake charts even if their data hasn't changed",
+    )
+    parser.add_argument(
+        '--jobs', '-j', type=int, default=0, metavar='N',
+        help="use up to N processes to convert PDFs and render charts (default: one per CPU)",  # noqa: E501
+    )
     parser.add_argument(
         '--hourly-modem-cost', action='store_true',
         help="generate chart showing team's hourly modem cost",
@@ -45,7 +94,16 @@ def parse_cli():
         '--teams', action='store_true',
         help="generate chart show teams' monthly session hours",
     )
-    parser.add_argument(
+    period = parser.add_mutually_exclusive_group()
+    period.add_argument(
+        '--daily', '-d', action='store_true',
+        help="use daily data instead of monthly",
+    )
+    period.add_argument(
+        '--weekly', '-w', action='store_true',
+        help="use weekly data instead of monthly",
+    )
+    period.add_argument(
         '--yearly', '-y', action='store_true',
         help="use yearly data instead of monthly",
     )
@@ -57,6 +115,7 @@ def parse_cli():
         '--test', action='store_true',
         help=argparse.SUPPRESS,
     )
+    add_profile_args(parser)
     return parser.parse_args()
 
 
@@ -72,10 +131,251 @@ def yearly_fmt(label):
     return label.year
 
 
-def gen_raw_session_df():
+PERIOD_FMTS = {
+    'daily': daily_fmt,
+    'weekly': daily_fmt,
+    'monthly': monthly_fmt,
+    'yearly': yearly_fmt,
+}
+
+
+def file_digest(file_path_obj):
+    h = hashlib.sha256()
+    with file_path_obj.open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_conversion_manifest(manifest_file):
+    if not manifest_file.is_file():
+        return {}
+    try:
+        with manifest_file.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"Warning: Ignoring unreadable manifest: {manifest_file}")
+        return {}
+
+
+def save_conversion_manifest(manifest, manifest_file):
+    tmp_file = manifest_file.with_name(f"{manifest_file.name}.tmp")
+    with tmp_file.open('w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp_file.replace(manifest_file)
+
+
+def convert_gl_reports(reports_dir, outdir, account_name=None, jobs=None):
+    """Convert only new or modified GL PDF reports to CSV.
+
+    Each converted PDF is recorded in a manifest in outdir, keyed by its path
+    and holding its size, mtime, SHA-256 digest and account name. A PDF is
+    skipped when its size and mtime (or, failing that, its digest) match the
+    manifest entry for the same account and its CSV file still exists. The
+    remaining PDFs are converted in parallel by up to `jobs` processes.
+    """
+    if not account_name:
+        account_name = DEFAULT_ACCOUNT
+    manifest_file = outdir / MANIFEST_NAME
+    old_manifest = load_conversion_manifest(manifest_file)
+    manifest = {}
+    pending = {}
+    for r in sorted(reports_dir.glob('* Bangui Internet-donor*.pdf')):
+        key = str(r)
+        stat = r.stat()
+        entry = old_manifest.get(key, {})
+        digest = entry.get('sha256')
+        if (entry.get('size'), entry.get('mtime_ns')) != (stat.st_size, stat.st_mtime_ns):  # noqa: E501
+            # New file, or size/mtime changed (e.g. after a re-sync).
+            digest = file_digest(r)
+        csv_file = entry.get('csv')
+        up_to_date = (
+            entry.get('account') == account_name
+            and entry.get('sha256') == digest
+            and (csv_file is None or Path(csv_file).is_file())
+        )
+        entry = {
+            'account': account_name,
+            'csv': csv_file,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'size': stat.st_size,
+        }
+        if up_to_date:
+            manifest[key] = entry
+        else:
+            pending[r] = entry
+
+    results, errors = pdfs_to_csv(
+        pending.keys(),
+        account_names=[account_name],
+        outdir=outdir,
+        jobs=jobs,
+    )
+    for r, csv_files in results.items():
+        csv_file = csv_files[account_name]
+        pending[r]['csv'] = str(csv_file) if csv_file else None
+        manifest[str(r)] = pending[r]
+    # Failed PDFs are left out of the manifest so they're retried next run.
+    for r, e in sorted(errors.items()):
+        print(f"Error: {r.name}: {e}")
+    save_conversion_manifest(manifest, manifest_file)
+    skipped = len(manifest) - len(results)
+    if skipped:
+        print(f"Skipped {skipped} unchanged GL report(s).")
+
+
+class DataLoader:
+    """Parse each data source once per run and share the resulting DataFrames.
+
+    Each DataFrame is cached along with the mtimes of the files it was built
+    from, and is rebuilt if any of those files change, appear or disappear.
+    Callers must treat the returned DataFrames as read-only.
+
+    If cache_dir is set and pyarrow is installed, the frames named in
+    PERSISTED_FRAMES are also saved there as Feather files, so later runs
+    can memory-map them instead of parsing the source CSVs again.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._cache = {}
+
+    def _get(self, key, source_files, build):
+        signature = tuple((str(f), f.stat().st_mtime_ns) for f in source_files)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        df = None
+        persist = self.cache_dir and feather and key in PERSISTED_FRAMES
+        if persist:
+            with PROFILER.stage('cache.read'):
+                df = self._read_cached_frame(key, signature)
+        if df is None:
+            with PROFILER.stage(f"load.{key}"):
+                df = build()
+            if persist:
+                with PROFILER.stage('cache.write'):
+                    self._write_cached_frame(key, signature, df)
+        self._cache[key] = (signature, df)
+        return df
+
+    def _read_cached_frame(self, key, signature):
+        meta_file = self.cache_dir / f"{key}.json"
+        frame_file = self.cache_dir / f"{key}.feather"
+        try:
+            with meta_file.open() as f:
+                meta = json.load(f)
+            if meta['version'] != CACHE_VERSION:
+                return None
+            if meta['sources'] != [list(s) for s in signature]:
+                return None
+            table = feather.read_table(frame_file, memory_map=True)
+        except (OSError, ValueError, KeyError, pa.ArrowException):
+            return None
+        df = table.to_pandas()
+        df = df.set_index(df.columns[0])
+        df.index.name = meta['index_name']
+        df.columns = meta['columns']
+        return df
+
+    def _write_cached_frame(self, key, signature, df):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta_file = self.cache_dir / f"{key}.json"
+        frame_file = self.cache_dir / f"{key}.feather"
+        # Feather needs a default index and unique string column names, so
+        # the index becomes the 1st column and the real names go in the JSON.
+        out = df.reset_index(names='index')
+        out.columns = ['index'] + [f"c{i}" for i in range(len(df.columns))]
+        meta = {
+            'version': CACHE_VERSION,
+            'sources': [list(s) for s in signature],
+            'index_name': df.index.name,
+            'columns': list(df.columns),
+        }
+        try:
+            feather.write_feather(out, frame_file)
+        except (OSError, TypeError, ValueError, pa.ArrowException) as e:
+            print(f"Warning: Couldn't cache \"{key}\": {e}")
+            return
+        # Write the metadata last so it never describes a partial file.
+        with meta_file.open('w') as f:
+            json.dump(meta, f, indent=2)
+
+    def raw_sessions(self):
+        return self._get(
+            'raw_sessions',
+            [get_responses_file()],
+            gen_raw_session_df,
+        )
+
+    def sessions(self):
+        return self._get(
+            'sessions',
+            [get_responses_file()],
+            lambda: gen_sessions_df(self.raw_sessions()),
+        )
+
+    def teams(self):
+        return self._get(
+            'teams',
+            [get_responses_file()],
+            lambda: gen_teams_df(self.raw_sessions()),
+        )
+
+    def raw_modem(self):
+        ledger_file = update_modem_ledger()
+        return self._get(
+            'raw_modem',
+            [ledger_file],
+            lambda: gen_raw_modem_df(ledger_file),
+        )
+
+    def clean_modem_expenses(self):
+        return self._get(
+            'clean_modem_expenses',
+            [update_modem_ledger()],
+            lambda: gen_clean_modem_expense_df(self.raw_modem()),
+        )
+
+
+DATA = DataLoader()
+
+
+def get_responses_file():
     csv_name = "SIL CAR services reporting (Responses) - Form Responses 2.csv"
-    responses_file = Path.home() / "Téléchargements" / csv_name
+    return Path.home() / "Téléchargements" / csv_name
+
+
+def update_modem_ledger():
+    """Add entries from new GL CSV files to the combined ledger.
 
+    Returns the path of the ledger file.
+    """
+    ledger = Ledger(DATADIR)
+    with PROFILER.stage('ledger.update'):
+        added = ledger.update()
+    if added:
+        print(f"Added {added} entries to: {ledger.file.name}")
+    return ledger.file
+
+
+def update_session_rollups():
+    """Add new form responses to the session totals.
+
+    Returns the SessionRollups.
+    """
+    rollups = SessionRollups(DATADIR / ROLLUPS_NAME)
+    with PROFILER.stage('rollups.update'):
+        added = rollups.update(get_responses_file(), DATA.raw_sessions)
+    if added:
+        print(f"Added {added} responses to: {ROLLUPS_NAME}")
+    return rollups
+
+
+def gen_raw_session_df(responses_file=None):
+    if responses_file is None:
+        responses_file = get_responses_file()
     df = pd.read_csv(
         responses_file,
         index_col=2,
@@ -86,27 +386,29 @@ def gen_raw_session_df():
     return df
 
 
-def gen_raw_modem_df():
-    # Get data from reports CSV files.
-    reports = DATADIR.glob('* CAR Bangui Internet: Communications.csv')
-    locale.setlocale(locale.LC_ALL, 'en_US')
-    df = pd.concat([
-        pd.read_csv(
-            f,
-            header=None,
-            index_col=0,
-            parse_dates=True,
-            date_format="%d-%b-%y",
-            thousands=','
-        ) for f in reports
-    ])
-    df.drop_duplicates(inplace=True)
-    df.sort_index(inplace=True)
-
-    # Save combined file for verification.
-    combined_file = DATADIR / "CAR Bangui Internet: Communications, combined.csv"  # noqa: E501
-    df.to_csv(combined_file, header=False)
+def gen_sessions_df(raw_df):
+    """Keep only session hours and format, for sessions with a format."""
+    cols = raw_df.columns.values
+    consultant_hours_df = raw_df[[cols[5], cols[6]]]
+    cols = consultant_hours_df.columns.values
+    # Remove rows with Null (NaN) values in 'Session format' column.
+    return consultant_hours_df.loc[consultant_hours_df[cols[1]].notna(), :]  # noqa: E501
 
+
+def gen_raw_modem_df(ledger_file=None):
+    # Get data from the combined ledger, which is already deduplicated and
+    # sorted by date.
+    if ledger_file is None:
+        ledger_file = update_modem_ledger()
+    locale.setlocale(locale.LC_ALL, 'en_US')
+    df = pd.read_csv(
+        ledger_file,
+        header=None,
+        index_col=0,
+        parse_dates=True,
+        date_format="%d-%b-%y",
+        thousands=','
+    )
     return df
 
 
@@ -119,19 +421,26 @@ def gen_session_df(df=None, period='monthly'):
     # Convert 'Work hours' column to float.
     df = df.astype({cols[0]: 'float'})
 
-    if period == 'monthly':
-        # Resample daily data into monthly data.
-        df = df.resample('M').sum()
-
-    elif period == 'yearly':
-        # Resample daily data into monthly data.
-        df = df.resample('Y').sum()
+    # Resample session data into daily, weekly, monthly or yearly data.
+    df = df.resample(RESAMPLE_RULES[period]).sum()
 
     # Remove wrongly-named (after resample) index header.
     df.index.names = [0]
     return df
 
 
+def gen_session_totals_df(rollups, format_prefix, period='monthly'):
+    """Hours of sessions whose format starts with format_prefix, per period.
+
+    Reads the stored totals; the result matches gen_session_df() on the
+    matching rows of the sessions DataFrame.
+    """
+    df = rollups.hours(period, format_prefix).to_frame()
+    # Same index header as gen_session_df().
+    df.index.names = [0]
+    return df
+
+
 def gen_remote_hours_df(df):
     # Assumes input is sessions_df.
     cols = df.columns.values
@@ -145,27 +454,23 @@ def gen_remote_hours_df(df):
 def gen_session_plot(df=None, title=None, period='monthly'):
     """Includes 3 columns: Work date, Duration, Session format"""
 
-    if period == 'monthly':
-        # Format the x-axis.
-        ax = df.plot(figsize=(16, 9), kind='bar', rot=45)
-        ax.set_xticklabels(map(monthly_fmt, df.index))
-
-    elif period == 'yearly':
-        # Format the x-axis.
-        ax = df.plot(figsize=(16, 9), kind='bar', rot=45)
-        ax.set_xticklabels(map(yearly_fmt, df.index))
+    fig, ax = plt.subplots(figsize=(16, 9))
+    df.plot(ax=ax, kind='bar', rot=45)
+    # Format the x-axis.
+    ax.set_xticklabels(map(PERIOD_FMTS[period], df.index))
 
     # Format the plot.
     ax.get_legend().remove()
     ax.set_ylabel("Hours")
     ax.set_xlabel(None)
-    plt.title(title)
+    ax.set_title(title)
     plt.rcParams.update({'font.size': 10})
-    return df
+    return fig, df
 
 
-def gen_clean_modem_expense_df():
-    raw_modem_df = gen_raw_modem_df()
+def gen_clean_modem_expense_df(raw_modem_df=None):
+    if raw_modem_df is None:
+        raw_modem_df = DATA.raw_modem()
     # Deduplicate (each month's file includes earlier months from same qtr.).
     dfm = raw_modem_df.drop_duplicates()
     cols = dfm.columns.values
@@ -187,51 +492,50 @@ def gen_clean_modem_expense_df():
     return dfm
 
 
-def gen_comparison_df():
-    dfm = gen_clean_modem_expense_df()
+def gen_comparison_df(period='monthly'):
+    dfm = DATA.clean_modem_expenses()
     # Only keep column index 4.
     dfm = dfm[[4]]
     # Rename column.
     dfm.columns = ["Modem credit"]
-    # Convert to monthly data.
-    dfm = dfm.resample('M').sum()
+    # Convert to daily, weekly, monthly or yearly data.
+    dfm = dfm.resample(RESAMPLE_RULES[period]).sum()
 
-    raw_session_df = gen_raw_session_df()
-    cols = raw_session_df.columns.values
-    consultant_hours_df = raw_session_df[[cols[5], cols[6]]]
-    cols = consultant_hours_df.columns.values
-    # Remove rows with Null (NaN) values in 'Session format' column.
-    dfs = consultant_hours_df.loc[consultant_hours_df[cols[1]].notna(), :]  # noqa: E501
     # Keep only Remote sessions.
-    dfs = gen_remote_hours_df(dfs)
+    dfs = gen_session_totals_df(update_session_rollups(), 'Remote', period)
     # Rename long-named columns.
-    dfs = dfs.rename(columns={cols[0]: "Session hours"})
-    dfs = gen_session_df(dfs, period='monthly')
+    dfs.columns = ["Session hours"]
 
     df = dfs.join(dfm)
     cols = df.columns.values
     # Change 'NaN' values in 'Modem credit' column to '0'.
     df[cols[1]] = df[cols[1]].fillna(0)
     print("gen_comparison_df:")
-    df["FCFA/hr"] = df.apply(calculate_monthly_rate, axis=1)
+    df["FCFA/hr"] = calculate_rate(df[cols[1]], df[cols[0]])
     df["Cum. Hrs."] = df[cols[0]].cumsum()
     df["Cum. Credit"] = df[cols[1]].cumsum()
-    df["FCFA/hr-to-date"] = df.apply(calculate_cum_rate, axis=1)
+    df["FCFA/hr-to-date"] = calculate_rate(df["Cum. Credit"], df["Cum. Hrs."])
     print(df.to_string())
     return df
 
 
-def gen_comparison_plot(title=None):
+def gen_comparison_plot_df(period='monthly'):
     # Get DataFrame.
-    df = gen_comparison_df()
+    df = gen_comparison_df(period)
     cols = df.columns.values
     # Remove 'NaN' values.
-    df = df.loc[df[cols[1]].notna(), :]
+    return df.loc[df[cols[1]].notna(), :]
+
+
+def gen_comparison_plot(df=None, title=None, period='monthly'):
+    if df is None:
+        df = gen_comparison_plot_df(period)
+    cols = df.columns.values
 
     rot = 45
     width = 0.5
 
-    fig, ax = plt.subplots(1)
+    fig, ax = plt.subplots(figsize=(16, 9))
     ax1 = df[cols[5]].plot(
         ax=ax,
         secondary_y=cols[5],
@@ -249,57 +553,65 @@ def gen_comparison_plot(title=None):
         width=width,
         rot=rot,
         legend=True,
-        figsize=(16, 9),
     )
     ax.set_ylabel("Hours")
     ax1.grid(False)
     ax2.grid(False)
-    ax.set_xticklabels(map(monthly_fmt, df.index))
+    ax.set_xticklabels(map(PERIOD_FMTS[period], df.index))
     ax.set_xlabel(None)
     # ax.legend(loc=0)
     ax1.legend(loc='upper right')
     ax2.legend(loc='upper left')
-    plt.title(title)
-    return df
+    ax.set_title(title)
+    return fig, df
 
 
-def gen_modem_cost_per_team_df():
-    dfm = gen_clean_modem_expense_df()
-    dft = gen_teams_df()
+def gen_modem_cost_per_team_df(dfm=None, dft=None):
+    if dfm is None:
+        dfm = DATA.clean_modem_expenses()
+    if dft is None:
+        dft = DATA.teams()
     teams = dft.columns.values
-    totals = {}
+    # Map each way a team is written in the ledger to the team's name.
+    aliases = {}
     for team in teams:
-        totals[team] = [0, 0]
-    # Add total modem cost to data dict.
-    for _, row in dfm.iterrows():
-        for team in teams:
-            if team.lower() in row[1] or team in row[1]:
-                totals[team][0] += row[4]
-    # Add total checking hours to data dict.
-    cols = dft.columns.values
-    for _, row in dft.iterrows():
-        for i, col in enumerate(cols):
-            totals[col][1] += row[i]
+        aliases[team] = team
+        aliases[team.lower()] = team
+    aliases.update({a: t for a, t in TEAM_ALIASES.items() if t in teams})
+    # Find the team in each entry's description (column index 1) with a
+    # single alternation, trying longer names first.
+    alternation = '|'.join(
+        re.escape(a) for a in sorted(aliases, key=len, reverse=True)
+    )
+    matched = dfm[1].str.extract(f"({alternation})", expand=False)
+    # Add up modem cost (column index 4) and session hours per team.
+    costs = dfm[4].groupby(matched.map(aliases)).sum()
+    hours = dft.sum()
     # Build dataframe.
-    df = pd.Series({k: v[0] / v[1] for k, v in totals.items()})
+    df = costs.reindex(teams, fill_value=0) / hours
+    df.index.name = None
+    df.name = None
     return df
 
 
-def gen_modem_cost_per_team_plot(title=None):
-    df = gen_modem_cost_per_team_df()
+def gen_modem_cost_per_team_plot(df=None, title=None):
+    if df is None:
+        df = gen_modem_cost_per_team_df()
+    fig, ax = plt.subplots(figsize=(16, 9))
     df.plot(
+        ax=ax,
         kind='bar',
-        figsize=(16, 9),
         ylabel="FCFA/hr",
         rot=45,
     )
-    plt.title(title)
-    return df
+    ax.set_title(title)
+    return fig, df
 
 
-def gen_teams_df():
+def gen_teams_df(df=None):
     """Take data from raw sessions and create new table."""
-    df = gen_raw_session_df()
+    if df is None:
+        df = DATA.raw_sessions()
     cols = df.columns.values
     # Remove 'None' rows from column index 5 (Hours).
     df = df.loc[df[cols[5]].notna(), :]
@@ -308,130 +620,161 @@ def gen_teams_df():
     # Keep only 'Remote session' rows.
     df = df[df[cols[6]].str.startswith('Remote')]
     # Remove hours not attributed to team budgets.
-    excl = (
-        "IT and Language Technology services, ACATBA",
-    )
-    df = df[~df[cols[2]].str.startswith(excl)]
+    df = df[~df[cols[2]].str.startswith(EXCLUDED_TEAMS)]
     # Keep only Team name and session hours columns.
     df = df[[cols[2], cols[5]]]
     cols = df.columns.values
-    # Split each team into own column.
-    teams = list(set(df[cols[0]].values))
-    teams.sort()
-    # new_cols = ['Work date', *teams]
-    new_df = pd.DataFrame(columns=teams)
-    for index, row in df.iterrows():
-        team = row[0]
-        hours = float(row[1])
-        if index in new_df.index.values:
-            # Update the row with additional data.
-            new_df.at[index, team] = hours
-        else:
-            # Add new row at given index.
-            team_index = teams.index(team)
-            new_row = [0 for i in range(len(teams))]  # initialize with zeros
-            new_row[team_index] = hours  # add hours to row
-            new_df.loc[index] = new_row  # put row at end of df
-            new_df = new_df.sort_index()  # sort df
+    # Split each team into own column, totaling each team's hours per date.
+    hours = df[cols[1]].astype('float')
+    new_df = hours.groupby([df.index, df[cols[0]]]).sum().unstack(fill_value=0)
+    new_df.index.name = None
+    new_df.columns.name = None
     return new_df
 
 
-def gen_teams_plot(title=None):
-    df = gen_teams_df()
-    # Resample on months.
-    df = df.resample('M').sum()
+def gen_teams_totals_df(rollups):
+    """Each team's remote session hours per month, from the stored totals.
+
+    Matches gen_teams_df() resampled on months.
+    """
+    return rollups.team_hours('monthly', 'Remote', EXCLUDED_TEAMS)
+
+
+def gen_teams_plot(df=None, title=None):
+    if df is None:
+        df = gen_teams_totals_df(update_session_rollups())
 
     # Prepare plot.
-    ax = df.plot(
+    fig, ax = plt.subplots(figsize=(16, 9))
+    df.plot(
+        ax=ax,
         kind='bar',
-        figsize=(16, 9),
         ylabel="Hours",
         rot=45,
         width=1,
     )
     ax.set_xticklabels(map(monthly_fmt, df.index))
     ax.set_xlabel(None)
-    plt.title(title)
-    return df
+    ax.set_title(title)
+    return fig, df
 
 
-def calculate_monthly_rate(row):
-    if not row[1].is_integer():
-        # print(row[1])
-        rate = None
-    elif row[0] == 0:
-        rate = float(0)
-    else:
-        rate = round(row[1] / row[0])
+def calculate_rate(credit, hours):
+    """Credit per hour, rounded; 0 if no hours, NaN if credit isn't whole."""
+    rate = (credit / hours).round()
+    rate = rate.mask(hours == 0, 0)
+    rate = rate.where(credit % 1 == 0)
+    if rate.notna().all():
+        rate = rate.astype('int64')
     return rate
 
 
-def calculate_cum_rate(row):
-    if not row[4].is_integer():
-        # print(row[1])
-        rate = None
-    elif row[3] == 0:
-        rate = float(0)
-    else:
-        rate = round(row[4] / row[3])
-    return rate
-
-
-def publish_plot(df=None, outfile=None, title=None):
+def chart_fingerprint(df, **params):
+    """Hash a chart's data and rendering parameters."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df).values.tobytes())
+    labels = df.columns if isinstance(df, pd.DataFrame) else [df.name]
+    params.update(
+        labels=[str(c) for c in labels],
+        style=STYLE,
+        version=CHART_VERSION,
+    )
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def chart_is_current(outfile, title, fingerprint):
+    """Check if the saved chart and CSV were made from the same inputs."""
+    if outfile is not None:
+        # Only the default outputs are tracked.
+        return False
+    png_file = CHARTSDIR / f"{title}.png"
+    csv_file = DATADIR / f"{title}.csv"
+    if not csv_file.is_file():
+        return False
+    try:
+        with Image.open(png_file) as im:
+            saved_fingerprint = im.text.get('Fingerprint')
+    except (OSError, AttributeError):
+        return False
+    if saved_fingerprint != fingerprint:
+        return False
+    print(f"Unchanged: {title}")
+    return True
+
+
+def publish_plot(df=None, outfile=None, title=None, fig=None, fingerprint=None):  # noqa: E501
     if outfile is None:
         outfile = CHARTSDIR / f"{title}.png"
         csvfile = DATADIR / f"{title}.csv"
 
+    if fig is None:
+        fig = plt.gcf()
+
     if not outfile:
         plt.show()
     else:
-        plt.savefig(outfile)
-        df.to_csv(csvfile)
-
-
-def make_local_chart(outfile, df, period):
+        metadata = {}
+        if fingerprint:
+            # Saved in the PNG so an unchanged chart can be skipped later.
+            metadata['Fingerprint'] = fingerprint
+        with PROFILER.stage('savefig'):
+            fig.savefig(outfile, metadata=metadata)
+        with PROFILER.stage('to_csv'):
+            df.to_csv(csvfile)
+        # Free the figure; a chart worker can render several charts.
+        plt.close(fig)
+
+
+def make_local_chart(outfile, rollups, period, force=False):
     title = "SIL CAR Face-to-Face Session Hours"
-    cols = df.columns.values
-    if 'Session format' not in cols:
-        print("Error: No \"Session format\" column.")
-        exit()
-    idx = list(cols).index("Session format")
-    local_hours_df = df[df[cols[idx]].str.startswith('In person')]
-    df_to_plot = gen_session_df(df=local_hours_df, period=period)
-    df = gen_session_plot(df_to_plot, title, period)
-    publish_plot(df, outfile, title)
+    df_to_plot = gen_session_totals_df(rollups, 'In person', period)
+    fingerprint = chart_fingerprint(df_to_plot, title=title, period=period)
+    if not force and chart_is_current(outfile, title, fingerprint):
+        return
+    fig, df = gen_session_plot(df_to_plot, title, period)
+    publish_plot(df, outfile, title, fig, fingerprint)
 
 
-def make_modem_rate_chart(outfile):
+def make_modem_rate_chart(outfile, period='monthly', force=False):
     title = "SIL CAR Modem Cost per Remote Session Hour"
-    df = gen_comparison_plot(title)
-    publish_plot(df, outfile, title)
+    df = gen_comparison_plot_df(period)
+    fingerprint = chart_fingerprint(df, title=title, period=period)
+    if not force and chart_is_current(outfile, title, fingerprint):
+        return
+    fig, df = gen_comparison_plot(df, title, period)
+    publish_plot(df, outfile, title, fig, fingerprint)
 
 
-def make_remote_chart(outfile, df, period):
+def make_remote_chart(outfile, rollups, period, force=False):
     title = "SIL CAR Remote Session Hours"
-    cols = df.columns.values
-    if 'Session format' not in cols:
-        print("Error: No \"Session format\" column.")
-        exit()
-    idx = list(cols).index("Session format")
-    # Only keep rows where 'Session format' starts with 'Remote'.
-    remote_hours_df = df[df[cols[idx]].str.startswith('Remote')]
-    df_to_plot = gen_session_df(df=remote_hours_df, period=period)
-    df = gen_session_plot(df_to_plot, title, period)
-    publish_plot(df, outfile, title)
+    # Only keep sessions whose format starts with 'Remote'.
+    df_to_plot = gen_session_totals_df(rollups, 'Remote', period)
+    fingerprint = chart_fingerprint(df_to_plot, title=title, period=period)
+    if not force and chart_is_current(outfile, title, fingerprint):
+        return
+    fig, df = gen_session_plot(df_to_plot, title, period)
+    publish_plot(df, outfile, title, fig, fingerprint)
 
 
-def make_teams_chart(outfile):
+def make_teams_chart(outfile, rollups, force=False):
     title = "ACATBA Teams' Remote Session Hours"
-    df = gen_teams_plot(title)
-    publish_plot(df, outfile, title)
+    df = gen_teams_totals_df(rollups)
+    fingerprint = chart_fingerprint(df, title=title)
+    if not force and chart_is_current(outfile, title, fingerprint):
+        return
+    fig, df = gen_teams_plot(df, title)
+    publish_plot(df, outfile, title, fig, fingerprint)
 
 
-def make_hourly_modem_cost_chart(outfile):
+def make_hourly_modem_cost_chart(outfile, force=False):
     title = "Modem Credit per Remote Session Hour"
-    df = gen_modem_cost_per_team_plot(title)
-    publish_plot(df, outfile, title)
+    df = gen_modem_cost_per_team_df()
+    fingerprint = chart_fingerprint(df, title=title)
+    if not force and chart_is_current(outfile, title, fingerprint):
+        return
+    fig, df = gen_modem_cost_per_team_plot(df, title)
+    publish_plot(df, outfile, title, fig, fingerprint)
 
 
 def test():
@@ -441,17 +784,87 @@ def test():
     pass
 
 
-def main():
-    # pd.set_option('copy_on_write', True)
-    args = parse_cli()
-
-    style = 'bmh'
+def setup_plot_style(style=STYLE):
     plt.style.use(style)
     plt.rc('axes', axisbelow=True)
 
     global COLORS
     COLORS = plt.rcParams['axes.prop_cycle'].by_key()['color']
 
+
+def make_chart(name, outfile, period, force=False):
+    """Make the named chart; return its name and the seconds it took."""
+    start = time.perf_counter()
+    with PROFILER.stage(f"chart.{name}"):
+        if name == 'hourly_modem_cost':
+            make_hourly_modem_cost_chart(outfile, force)
+        elif name == 'local':
+            make_local_chart(outfile, update_session_rollups(), period, force)  # noqa: E501
+        elif name == 'modem_rate':
+            make_modem_rate_chart(outfile, period, force)
+        elif name == 'remote':
+            make_remote_chart(outfile, update_session_rollups(), period, force)  # noqa: E501
+        elif name == 'teams':
+            make_teams_chart(outfile, update_session_rollups(), force)
+    return name, time.perf_counter() - start
+
+
+def init_chart_worker(chartsdir, datadir, cache_dir):
+    """Give a chart process the same settings as the main process."""
+    # Workers only render to files, so they don't need a GUI backend.
+    plt.switch_backend('agg')
+    setup_plot_style()
+
+    global CHARTSDIR
+    CHARTSDIR = chartsdir
+    global DATADIR
+    DATADIR = datadir
+    DATA.cache_dir = cache_dir
+
+
+def make_charts(names, period, jobs=None, force=False):
+    """Render the named charts to files in parallel, one figure per job."""
+    workers = min(jobs or os.cpu_count() or 1, len(names))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_chart_worker,
+        initargs=(CHARTSDIR, DATADIR, DATA.cache_dir),
+    ) as executor:
+        if PROFILER.enabled:
+            futures = [
+                executor.submit(call_profiled, make_chart, n, None, period, force)  # noqa: E501
+                for n in names
+            ]
+        else:
+            futures = [
+                executor.submit(make_chart, n, None, period, force)
+                for n in names
+            ]
+        chart_secs = 0
+        for future in futures:
+            result = future.result()
+            if PROFILER.enabled:
+                result, stages = result
+                PROFILER.merge(stages)
+            chart_secs += result[1]
+    wall_secs = time.perf_counter() - start
+    print(
+        f"Rendered {len(names)} charts in {wall_secs:.1f} s with {workers} "
+        f"processes ({chart_secs:.1f} s of chart time, "
+        f"{chart_secs / wall_secs:.1f}x speedup)."
+    )
+
+
+def main():
+    # pd.set_option('copy_on_write', True)
+    args = parse_cli()
+    if args.profile or args.profile_json or args.profile_dir:
+        PROFILER.enable(args.profile_dir)
+        atexit.register(PROFILER.report, args.profile_json)
+
+    setup_plot_style()
+
     global CHARTSDIR
     CHARTSDIR = Path(__file__).parent / 'charts'
     CHARTSDIR.mkdir(parents=True, exist_ok=True)
@@ -468,51 +881,46 @@ def main():
     DATADIR = REPORTSDIR.parent / 'GL Data'
     DATADIR.mkdir(parents=True, exist_ok=True)
 
-    # Convert GL PDF reports to CSV.
-    for r in REPORTSDIR.glob('* Bangui Internet-donor*.pdf'):
-        pdf_to_csv(r, outdir=DATADIR)
+    # Parsed data from earlier runs.
+    DATA.cache_dir = REPORTSDIR.parent / 'GL Cache'
+
+    jobs = args.jobs if args.jobs > 0 else None
+
+    # Convert new or modified GL PDF reports to CSV.
+    with PROFILER.stage('convert_gl_reports'):
+        convert_gl_reports(REPORTSDIR, DATADIR, jobs=jobs)
     print()
 
     if args.test:
         test()
         exit()
 
-    raw_df = gen_raw_session_df()
-    cols = raw_df.columns.values
-    consultant_hours_df = raw_df[[cols[5], cols[6]]]
-    cols = consultant_hours_df.columns.values
-    # Remove rows with Null (NaN) values in 'Session format' column.
-    sessions_df = consultant_hours_df.loc[consultant_hours_df[cols[1]].notna(), :]  # noqa: E501
-
     outfile = None
     if args.show:
         outfile = False
 
     period = 'monthly'
-    if args.yearly:
+    if args.daily:
+        period = 'daily'
+    elif args.weekly:
+        period = 'weekly'
+    elif args.yearly:
         period = 'yearly'
 
-    if args.remote:
-        make_remote_chart(outfile, sessions_df, period)
-
-    if args.hourly_modem_cost:
-        make_hourly_modem_cost_chart(outfile)
-
-    if args.local:
-        make_local_chart(outfile, sessions_df, period)
-
-    if args.modem_rate:
-        make_modem_rate_chart(outfile)
-
-    if args.teams:
-        make_teams_chart(outfile)
-
-    if args.all:
-        make_hourly_modem_cost_chart(outfile)
-        make_local_chart(outfile, sessions_df, period)
-        make_modem_rate_chart(outfile)
-        make_remote_chart(outfile, sessions_df, period)
-        make_teams_chart(outfile)
+    names = [n for n in CHART_NAMES if args.all or getattr(args, n)]
+    if outfile is False or len(names) < 2 or jobs == 1:
+        for name in names:
+            make_chart(name, outfile, period, args.force)
+        return
+
+    # Load the data once up front; on platforms that fork, the chart
+    # processes inherit it. Elsewhere they read it from the cache files.
+    # The session totals are brought up to date here, so that the chart
+    # processes only read them.
+    update_session_rollups()
+    DATA.teams()
+    DATA.clean_modem_expenses()
+    make_charts(names, period, jobs, args.force)
 
 
 if __name__ == '__main__':
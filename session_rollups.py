@@ -0,0 +1,256 @@
+""" Daily, monthly and yearly totals of session hours, kept in SQLite.
+
+The totals are grouped by session format and team, so the session and team
+charts only read a few rows per period instead of resampling every form
+response. A key for each response already counted is kept with the totals,
+so update() only adds the responses that are new since the last update.
+"""
+
+import json
+import sqlite3
+
+import pandas as pd
+
+from gl_ledger import file_signature
+
+# Bump when a change to the keys or totals makes stored rollups stale.
+ROLLUPS_VERSION = 1
+# Column positions in the form responses, once the work date is the index.
+TEAM_COL = 2
+HOURS_COL = 5
+FORMAT_COL = 6
+# Stored periods, with the pandas frequency of their date labels.
+PERIOD_FREQS = {'daily': 'D', 'monthly': 'M', 'yearly': 'Y'}
+# Periods made from the daily totals when they're read.
+DERIVED_FREQS = {'weekly': 'W'}
+
+
+def response_keys(raw_df):
+    """Return a key for each response row, as a (hash, n) MultiIndex.
+
+    The hash covers all of the row's fields, and n counts earlier rows
+    with the same fields, so repeated rows still each get their own key.
+    """
+    hashes = pd.util.hash_pandas_object(raw_df).values.view('int64')
+    hashes = pd.Series(hashes)
+    occurrences = hashes.groupby(hashes).cumcount()
+    return pd.MultiIndex.from_arrays(
+        [hashes.values, occurrences.values],
+        names=['hash', 'n'],
+    )
+
+
+def session_rows(raw_df):
+    """Keep the date, format, team and hours of responses with a format.
+
+    Rows without hours still count towards the period range, with 0 hours
+    and 0 sessions; the team charts leave them out.
+    """
+    cols = raw_df.columns.values
+    df = raw_df[raw_df[cols[FORMAT_COL]].notna()]
+    hours = df[cols[HOURS_COL]].astype('float')
+    return pd.DataFrame(
+        {
+            'format': df[cols[FORMAT_COL]].values,
+            'team': df[cols[TEAM_COL]].fillna('').values,
+            'hours': hours.fillna(0).values,
+            'sessions': hours.notna().astype('int64').values,
+        },
+        index=df.index.normalize(),
+    )
+
+
+def period_totals(rows, period):
+    """Add up the rows' hours and sessions per period, format and team.
+
+    Each period is labelled with its last day, as resample() does.
+    """
+    dates = rows.index
+    if period == 'monthly':
+        dates = dates + pd.offsets.MonthEnd(0)
+    elif period == 'yearly':
+        dates = dates + pd.offsets.YearEnd(0)
+    totals = rows.groupby([dates, rows['format'], rows['team']]).sum()
+    return [
+        (period, d.strftime('%Y-%m-%d'), f, t, h, int(s))
+        for (d, f, t), (h, s) in zip(totals.index, totals.values)
+    ]
+
+
+class SessionRollups:
+    """Session hour totals per period, session format and team.
+
+    Besides the totals, the database holds the key of each response row
+    they include, the signature of the responses file, and the name of its
+    hours column. If the file is unchanged since the last update, it isn't
+    read at all. If rows were changed or removed, the totals are rebuilt.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def _connect(self):
+        con = sqlite3.connect(self.db_file)
+        con.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS responses (
+                hash INTEGER,
+                n INTEGER,
+                PRIMARY KEY (hash, n)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rollups (
+                period TEXT,
+                date TEXT,
+                format TEXT,
+                team TEXT,
+                hours REAL,
+                sessions INTEGER,
+                PRIMARY KEY (period, date, format, team)
+            ) WITHOUT ROWID;
+            """
+        )
+        return con
+
+    def _meta(self, con):
+        return dict(con.execute("SELECT key, value FROM meta"))
+
+    def update(self, responses_file, load_raw):
+        """Add new form responses to the totals; return how many were added.
+
+        load_raw() returns the raw responses DataFrame; it's only called if
+        the file changed. If the totals had to be rebuilt, all of the
+        responses count as added.
+        """
+        signature = json.dumps(file_signature(responses_file))
+        con = self._connect()
+        try:
+            meta = self._meta(con)
+            current = meta.get('version') == str(ROLLUPS_VERSION)
+            if current and meta.get('source') == signature:
+                return 0
+            raw_df = load_raw()
+            hours_label = str(raw_df.columns.values[HOURS_COL])
+            keys = response_keys(raw_df)
+            stored = pd.MultiIndex.from_tuples(
+                con.execute("SELECT hash, n FROM responses").fetchall(),
+                names=['hash', 'n'],
+            )
+            rebuild = (
+                not current
+                or meta.get('hours_label') != hours_label
+                or not stored.isin(keys).all()
+            )
+            with con:
+                if rebuild:
+                    con.execute("DELETE FROM responses")
+                    con.execute("DELETE FROM rollups")
+                    new = pd.Series(True, index=range(len(raw_df)))
+                else:
+                    new = pd.Series(~keys.isin(stored))
+                self._add(con, raw_df[new.values], keys[new.values])
+                con.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [
+                        ('version', str(ROLLUPS_VERSION)),
+                        ('source', signature),
+                        ('hours_label', hours_label),
+                    ],
+                )
+            return int(new.sum())
+        finally:
+            con.close()
+
+    def _add(self, con, raw_df, keys):
+        con.executemany(
+            "INSERT INTO responses VALUES (?, ?)",
+            ((int(h), int(n)) for h, n in keys),
+        )
+        rows = session_rows(raw_df)
+        if rows.empty:
+            return
+        for period in PERIOD_FREQS:
+            con.executemany(
+                """
+                INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (period, date, format, team) DO UPDATE SET
+                    hours = hours + excluded.hours,
+                    sessions = sessions + excluded.sessions
+                """,
+                period_totals(rows, period),
+            )
+
+    def totals(self, period):
+        """Return the stored totals of a period, in date order."""
+        con = self._connect()
+        try:
+            hours_label = self._meta(con).get('hours_label')
+            df = pd.read_sql_query(
+                "SELECT date, format, team, hours, sessions FROM rollups "
+                "WHERE period = ? ORDER BY date",
+                con,
+                params=(period,),
+                parse_dates=['date'],
+            )
+        finally:
+            con.close()
+        df.attrs['hours_label'] = hours_label
+        return df
+
+    def hours(self, period, format_prefix):
+        """Return a Series of the hours of sessions whose format starts
+        with format_prefix, per period.
+
+        Like resampling the responses, periods without sessions between
+        the first and last ones are included, with 0 hours.
+        """
+        base = 'daily' if period in DERIVED_FREQS else period
+        df = self.totals(base)
+        df = df[df['format'].str.startswith(format_prefix)]
+        hours = df.groupby('date')['hours'].sum()
+        hours.name = df.attrs['hours_label']
+        return fill_periods(hours, period)
+
+    def team_hours(self, period, format_prefix, excluded_teams=()):
+        """Return a DataFrame of each team's hours per period, for sessions
+        whose format starts with format_prefix.
+
+        Responses without a team or without hours are left out, as are
+        teams whose names start with one of excluded_teams.
+        """
+        base = 'daily' if period in DERIVED_FREQS else period
+        df = self.totals(base)
+        df = df[
+            df['format'].str.startswith(format_prefix)
+            & (df['team'] != '')
+            & ~df['team'].str.startswith(tuple(excluded_teams))
+            & (df['sessions'] > 0)
+        ]
+        teams = df.pivot_table(
+            index='date',
+            columns='team',
+            values='hours',
+            aggfunc='sum',
+            fill_value=0,
+        )
+        teams.index.name = None
+        teams.columns.name = None
+        return fill_periods(teams, period)
+
+
+def fill_periods(df, period):
+    """Add the missing periods between the first and last, with 0 hours."""
+    if period in DERIVED_FREQS:
+        return df.resample(DERIVED_FREQS[period]).sum()
+    if df.empty:
+        return df
+    dates = pd.date_range(
+        df.index.min(),
+        df.index.max(),
+        freq=PERIOD_FREQS[period],
+        name=df.index.name,
+    )
+    return df.reindex(dates, fill_value=0)
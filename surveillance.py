@@ -0,0 +1,387 @@
+#!/usr/bin/python3
+
+# Surveiller des hôtes, disques, services et journaux sans arrêt.
+#
+# Les scripts check_*.py sont chargés une seule fois, comme modules, et leur
+# fonction verifier() est appelée selon la configuration : chaque
+# vérification a son intervalle, son délai maximum et sa gigue (un décalage
+# au hasard, pour que les vérifications ne partent pas toutes en même
+# temps). Elles s'exécutent en parallèle. Seuls les changements de statut
+# sont affichés. Avec --resultats (ou "resultats" dans la configuration),
+# chaque résultat est aussi écrit, par lots, en lignes JSON, en CSV ou dans
+# une base SQLite (voir resultats.py).
+#
+# Exemples :
+#   ./surveillance.py --config surveillance.exemple.json
+#   ./surveillance.py --une-fois
+#   ./surveillance.py --resultats surveillance.sqlite
+
+# Importer des modules dont nous avons besoin
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import random
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import resultats
+
+# Définition des variables globales
+CONFIG_PAR_DEFAUT = Path("./surveillance.json")
+# Valeurs par défaut de chaque vérification, en secondes.
+DEFAUTS = {
+    'intervalle': 60,
+    'delai_max': 30,
+    'gigue': 0,
+}
+# Paramètres qui donnent la cible d'une vérification, si "cible" manque.
+PARAMETRES_CIBLE = ('adresse', 'chemin', 'nom')
+# Résultats gardés au plus pendant que la sortie ne peut pas être écrite;
+# au-delà, les plus anciens sont abandonnés.
+RESULTATS_EN_ATTENTE_MAX = 10000
+
+
+class Verification:
+    """Une vérification configurée : un module check_* et ses paramètres.
+
+    Le module doit avoir une fonction verifier(**parametres), normale ou
+    async, qui retourne un statut ('ok', 'alerte', ...), un message et,
+    si elle en a une, une valeur mesurée (latence, part du disque
+    utilisée, nombre de processus...).
+    """
+
+    def __init__(self, nom, module, intervalle=DEFAUTS['intervalle'],
+                 delai_max=DEFAUTS['delai_max'], gigue=DEFAUTS['gigue'],
+                 parametres=None, cible=None):
+        self.nom = nom
+        self.module = module
+        self.verifier = importlib.import_module(module).verifier
+        self.intervalle = intervalle
+        self.delai_max = delai_max
+        self.gigue = gigue
+        self.parametres = parametres or {}
+        if cible is None:
+            cible = next(
+                (self.parametres[p] for p in PARAMETRES_CIBLE if p in self.parametres),  # noqa: E501
+                '',
+            )
+        self.cible = cible
+        self.fil = None
+
+    def _dans_un_fil(self):
+        """Appeler verifier() dans un fil à part; retourner un futur asyncio.
+
+        Un fil qui dépasse le délai ne peut pas être arrêté. Contrairement
+        à asyncio.to_thread(), c'est un fil "daemon", qui n'empêche pas le
+        programme de quitter.
+        """
+        boucle = asyncio.get_running_loop()
+        futur = boucle.create_future()
+
+        def terminer(resultat, erreur):
+            if futur.done():
+                return
+            if erreur:
+                futur.set_exception(erreur)
+            else:
+                futur.set_result(resultat)
+
+        def executer():
+            resultat, erreur = None, None
+            try:
+                resultat = self.verifier(**self.parametres)
+            except Exception as e:
+                erreur = e
+            try:
+                boucle.call_soon_threadsafe(terminer, resultat, erreur)
+            except RuntimeError:
+                # La boucle est déjà fermée.
+                pass
+
+        self.fil = threading.Thread(target=executer, daemon=True)
+        self.fil.start()
+        return futur
+
+    async def executer(self):
+        """Exécuter la vérification une fois.
+
+        Retourner le statut, le message et la valeur (ou None).
+        """
+        if inspect.iscoroutinefunction(self.verifier):
+            appel = self.verifier(**self.parametres)
+        elif self.fil and self.fil.is_alive():
+            # Ne pas empiler les fils d'une vérification bloquée.
+            return 'erreur', "L'exécution précédente n'est pas terminée", None
+        else:
+            appel = self._dans_un_fil()
+        try:
+            statut, message, *valeur = await asyncio.wait_for(appel, self.delai_max)  # noqa: E501
+        except asyncio.TimeoutError:
+            return 'erreur', f"Délai de {self.delai_max} s dépassé", None
+        except Exception as e:
+            return 'erreur', f"{type(e).__name__}: {e}", None
+        return statut, message, valeur[0] if valeur else None
+
+    async def mesurer(self):
+        """Exécuter la vérification une fois; retourner un Resultat."""
+        horodatage = resultats.maintenant()
+        debut = time.monotonic()
+        statut, message, valeur = await self.executer()
+        return resultats.resultat(
+            self.nom, self.cible, statut, valeur, message,
+            time.monotonic() - debut, horodatage,
+        )
+
+
+def lire_json(chemin):
+    with open(chemin, encoding='UTF-8') as f:
+        return json.load(f)
+
+
+def lire_config(chemin):
+    """Retourner les vérifications décrites dans un fichier JSON.
+
+    {
+      "defauts": {"intervalle": 60, "delai_max": 30, "gigue": 5},
+      "verifications": [
+        {"nom": "routeur", "module": "check_address", "intervalle": 10,
+         "parametres": {"adresse": "192.168.1.1"}},
+        ...
+      ],
+      "resultats": {"chemin": "surveillance.sqlite", "taille_lot": 100}
+    }
+    """
+    config = lire_json(chemin)
+    defauts = {**DEFAUTS, **config.get('defauts', {})}
+    verifications = []
+    for v in config['verifications']:
+        v = {**defauts, **v}
+        v.setdefault('nom', v['module'])
+        verifications.append(Verification(**v))
+    noms = [v.nom for v in verifications]
+    doublons = sorted({n for n in noms if noms.count(n) > 1})
+    if doublons:
+        raise ValueError(f"Noms de vérification en double : {', '.join(doublons)}")  # noqa: E501
+    return verifications
+
+
+def lire_sortie(chemin, chemin_resultats=None, format=None):
+    """Ouvrir la sortie des résultats, ou retourner None.
+
+    `chemin_resultats` et `format` remplacent ceux de la configuration.
+    """
+    options = dict(lire_json(chemin).get('resultats') or {})
+    if chemin_resultats:
+        options['chemin'] = chemin_resultats
+    if format:
+        options['format'] = format
+    if not options.get('chemin'):
+        return None
+    return resultats.ouvrir_sortie(**options)
+
+
+async def attendre(arret, secondes):
+    """Attendre `secondes`, ou moins si `arret` est signalé."""
+    try:
+        await asyncio.wait_for(arret.wait(), secondes)
+    except asyncio.TimeoutError:
+        pass
+
+
+class Surveillance:
+    """Exécuter les vérifications sans arrêt et signaler les changements.
+
+    Le dernier statut de chaque vérification est gardé en mémoire et, si
+    fichier_etat est donné, dans ce fichier JSON, pour qu'un redémarrage
+    ne signale pas à nouveau les statuts inchangés. Tous les résultats,
+    changés ou non, vont dans `sortie` s'il y en a une. Si elle ne peut
+    pas être écrite (disque plein, base verrouillée...), l'erreur est
+    affichée, les vérifications continuent, et les résultats attendent le
+    prochain essai, toutes les `sortie.delai_max` secondes.
+    """
+
+    def __init__(self, verifications, fichier_etat=None, sortie=None):
+        self.verifications = verifications
+        self.fichier_etat = Path(fichier_etat) if fichier_etat else None
+        self.etat = self.lire_etat()
+        self.sortie = sortie
+        self.erreur_sortie = None
+        # Les changements vont sur stderr si les résultats vont sur stdout.
+        self.affichage = sys.stdout
+        if sortie is not None and getattr(sortie, 'fichier', None) is sys.stdout:  # noqa: E501
+            self.affichage = sys.stderr
+
+    def lire_etat(self):
+        if not self.fichier_etat or not self.fichier_etat.is_file():
+            return {}
+        try:
+            with self.fichier_etat.open(encoding='UTF-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print(f"Attention : état illisible ignoré : {self.fichier_etat}", file=sys.stderr)  # noqa: E501
+            return {}
+
+    def sauver_etat(self):
+        if not self.fichier_etat:
+            return
+        temporaire = self.fichier_etat.with_name(f"{self.fichier_etat.name}.tmp")  # noqa: E501
+        with temporaire.open('w', encoding='UTF-8') as f:
+            json.dump(self.etat, f, indent=2, ensure_ascii=False)
+        temporaire.replace(self.fichier_etat)
+
+    def signaler(self, verification, statut, message):
+        """Afficher le résultat s'il change le statut de la vérification."""
+        precedent = self.etat.get(verification.nom, {}).get('statut')
+        if statut == precedent:
+            return
+        maintenant = datetime.now().isoformat(sep=' ', timespec='seconds')
+        print(
+            f"{maintenant} {verification.nom}: {precedent or 'inconnu'} -> "
+            f"{statut}: {message}",
+            file=self.affichage,
+            flush=True,
+        )
+        self.etat[verification.nom] = {
+            'statut': statut,
+            'message': message,
+            'depuis': maintenant,
+        }
+        self.sauver_etat()
+
+    def enregistrer(self, verification, resultat):
+        self.signaler(verification, resultat.statut, resultat.message)
+        if self.sortie is None:
+            return
+        if self.erreur_sortie is None:
+            self.ecrire_resultats(self.sortie.ajouter, resultat)
+        else:
+            # Ne pas réessayer à chaque résultat : vider_regulierement()
+            # s'en charge.
+            self.sortie.lot.append(resultat)
+            self.limiter_attente()
+
+    def ecrire_resultats(self, ecrire, *args):
+        """Appeler une méthode de la sortie et afficher ses erreurs.
+
+        Le lot qui n'a pas pu être écrit reste dans la sortie.
+        """
+        try:
+            ecrire(*args)
+        except (OSError, sqlite3.Error) as e:
+            if str(e) != self.erreur_sortie:
+                maintenant = datetime.now().isoformat(sep=' ', timespec='seconds')  # noqa: E501
+                print(
+                    f"{maintenant} Erreur d'écriture des résultats : {e} "
+                    f"({len(self.sortie.lot)} en attente)",
+                    file=self.affichage,
+                    flush=True,
+                )
+            self.erreur_sortie = str(e)
+            self.limiter_attente()
+            return False
+        if self.erreur_sortie is not None:
+            maintenant = datetime.now().isoformat(sep=' ', timespec='seconds')
+            print(
+                f"{maintenant} Résultats écrits à nouveau",
+                file=self.affichage,
+                flush=True,
+            )
+            self.erreur_sortie = None
+        return True
+
+    def limiter_attente(self):
+        """Abandonner les plus vieux résultats en attente, s'il y en a trop."""
+        en_trop = len(self.sortie.lot) - RESULTATS_EN_ATTENTE_MAX
+        if en_trop > 0:
+            del self.sortie.lot[:en_trop]
+
+    async def vider_regulierement(self, arret):
+        """Écrire les lots qui attendent depuis trop longtemps."""
+        while not arret.is_set():
+            await attendre(arret, self.sortie.delai_max)
+            if self.sortie.en_retard():
+                self.ecrire_resultats(self.sortie.vider)
+
+    async def surveiller(self, verification, arret):
+        # Décaler le premier départ de chaque vérification.
+        await attendre(arret, random.uniform(0, verification.gigue))
+        while not arret.is_set():
+            debut = time.monotonic()
+            self.enregistrer(verification, await verification.mesurer())
+            gigue = random.uniform(-verification.gigue, verification.gigue)
+            pause = verification.intervalle + gigue - (time.monotonic() - debut)  # noqa: E501
+            await attendre(arret, max(pause, 0))
+
+    async def executer_une_fois(self):
+        mesures = await asyncio.gather(
+            *(v.mesurer() for v in self.verifications)
+        )
+        for v, resultat in zip(self.verifications, mesures):
+            self.enregistrer(v, resultat)
+
+    async def executer(self):
+        """Surveiller jusqu'à SIGINT ou SIGTERM."""
+        arret = asyncio.Event()
+        boucle = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                boucle.add_signal_handler(signum, arret.set)
+            except NotImplementedError:
+                # Windows : Ctrl+C lève KeyboardInterrupt.
+                pass
+        taches = [self.surveiller(v, arret) for v in self.verifications]
+        if self.sortie is not None:
+            taches.append(self.vider_regulierement(arret))
+        await asyncio.gather(*taches)
+
+
+def analyser_arguments():
+    parser = argparse.ArgumentParser(
+        description="Exécuter les vérifications check_* sans arrêt.",
+    )
+    parser.add_argument(
+        '--config', '-c', default=CONFIG_PAR_DEFAUT,
+        help="fichier JSON des vérifications (par défaut : %(default)s)",
+    )
+    parser.add_argument(
+        '--etat', '-e',
+        help="fichier JSON où garder le dernier statut de chaque vérification",
+    )
+    parser.add_argument(
+        '--une-fois', action='store_true',
+        help="exécuter chaque vérification une seule fois, puis quitter",
+    )
+    resultats.ajouter_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = analyser_arguments()
+    try:
+        verifications = lire_config(args.config)
+        sortie = lire_sortie(args.config, args.resultats, args.format_resultats)  # noqa: E501
+    except (OSError, ValueError, KeyError, TypeError, ImportError, AttributeError) as e:  # noqa: E501
+        print(f"Erreur de configuration : {e}", file=sys.stderr)
+        exit(1)
+    surveillance = Surveillance(verifications, args.etat, sortie)
+    try:
+        if args.une_fois:
+            asyncio.run(surveillance.executer_une_fois())
+        else:
+            asyncio.run(surveillance.executer())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if sortie is not None and not surveillance.ecrire_resultats(sortie.fermer):  # noqa: E501
+            print(f"{len(sortie.lot)} résultats non écrits", file=surveillance.affichage)  # noqa: E501
+
+
+if __name__ == '__main__':
+    main()